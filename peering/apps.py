@@ -5,3 +5,7 @@ from django.apps import AppConfig
 
 class PeeringConfig(AppConfig):
     name = 'peering'
+
+    def ready(self):
+        # Connect signal receivers
+        from . import signals  # noqa: F401
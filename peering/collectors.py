@@ -0,0 +1,90 @@
+from __future__ import unicode_literals
+
+import logging
+import math
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+
+class BGPSessionsCollection(object):
+    """
+    Result of a BGP sessions collection. Sessions and failures are indexed by
+    router, a router is part of only one of them.
+    """
+
+    def __init__(self):
+        self.sessions = OrderedDict()
+        self.failures = OrderedDict()
+
+    def __str__(self):
+        return '{} routers collected, {} failed'.format(len(self.sessions),
+                                                        len(self.failures))
+
+
+class BGPSessionsCollector(object):
+    """
+    Class used to get the BGP sessions of several routers at once. Routers
+    are reached in parallel using a bounded pool of threads, a router failing
+    or timing out does not prevent the others from being collected.
+    """
+    logger = logging.getLogger('peering.manager.napalm')
+
+    def __init__(self, max_workers=None, timeout=None):
+        self.max_workers = max_workers or settings.NAPALM_WORKERS
+        self.timeout = timeout or settings.NAPALM_TIMEOUT
+
+    def fetch(self, router):
+        self.logger.debug('collecting bgp sessions from %s', router.hostname)
+        return router.fetch_bgp_sessions(timeout=self.timeout)
+
+    def collect(self, routers):
+        """
+        Returns a BGPSessionsCollection for the given routers.
+
+        Each router gets the timeout for its own NAPALM operations. Routers
+        still waiting after all batches of workers should have been done are
+        reported as timed out.
+        """
+        routers = list(routers)
+        collection = BGPSessionsCollection()
+
+        if not routers:
+            return collection
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = OrderedDict((executor.submit(self.fetch, router), router)
+                              for router in routers)
+
+        batches = math.ceil(len(routers) / float(self.max_workers))
+        done, not_done = wait(futures, timeout=self.timeout * batches)
+
+        for future, router in futures.items():
+            if future in not_done:
+                future.cancel()
+                collection.failures[router] = 'Timed out after {} seconds'.format(
+                    self.timeout)
+            elif future.exception():
+                collection.failures[router] = str(future.exception())
+            else:
+                collection.sessions[router] = future.result()
+
+        for router, error in collection.failures.items():
+            self.logger.error('cannot collect bgp sessions from %s: %s',
+                              router.hostname, error)
+
+        # Do not wait for hanging devices, their threads end with the NAPALM
+        # timeout
+        executor.shutdown(wait=False)
+
+        return collection
+
+
+def collect_bgp_sessions(routers, max_workers=None, timeout=None):
+    """
+    Collects the BGP sessions of the given routers in parallel and returns a
+    BGPSessionsCollection.
+    """
+    return BGPSessionsCollector(max_workers=max_workers, timeout=timeout).collect(routers)
@@ -0,0 +1,211 @@
+from __future__ import unicode_literals
+
+import atexit
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class PooledConnection(object):
+    """
+    A NAPALM device kept open between operations. The lock is held by the
+    thread using the device.
+    """
+
+    def __init__(self):
+        self.device = None
+        self.fingerprint = None
+        self.opened = 0
+        self.last_used = 0
+        self.lock = threading.Lock()
+
+    def is_expired(self, now, idle_timeout, max_lifetime):
+        return (now - self.opened >= max_lifetime or
+                now - self.last_used >= idle_timeout)
+
+
+class NAPALMConnectionPool(object):
+    """
+    Per-process pool of open NAPALM devices, one per router. Repeated
+    operations against the same router reuse the same session instead of
+    setting up a new SSH/NETCONF connection each time.
+
+    A device is closed when it has not been used for NAPALM_POOL_IDLE_TIMEOUT
+    seconds, when it has been open for NAPALM_POOL_MAX_LIFETIME seconds, when
+    it fails its health check or when an operation raises an error. Setting
+    NAPALM_POOL_MAX_LIFETIME to 0 closes devices after each use. Expired
+    devices are closed by a background thread running while devices are
+    open, even if the pool is not used anymore.
+    """
+    logger = logging.getLogger('peering.manager.napalm')
+
+    def __init__(self, idle_timeout=None, max_lifetime=None):
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.connections = {}
+        self.lock = threading.Lock()
+        self.reaper = None
+
+    def get_idle_timeout(self):
+        return self.idle_timeout if self.idle_timeout is not None else settings.NAPALM_POOL_IDLE_TIMEOUT
+
+    def get_max_lifetime(self):
+        return self.max_lifetime if self.max_lifetime is not None else settings.NAPALM_POOL_MAX_LIFETIME
+
+    def is_expired(self, connection, now=None):
+        return connection.is_expired(now or time.time(),
+                                     self.get_idle_timeout(),
+                                     self.get_max_lifetime())
+
+    def is_alive(self, connection):
+        try:
+            return connection.device.is_alive().get('is_alive', False)
+        except NotImplementedError:
+            # The driver cannot tell, assume the device is still usable
+            return True
+        except Exception:
+            return False
+
+    def close(self, connection):
+        """
+        Closes the device of a connection, the caller must hold its lock.
+        """
+        if not connection.device:
+            return
+
+        try:
+            connection.device.close()
+        except Exception:
+            pass
+
+        connection.device = None
+
+    def evict_idle(self):
+        """
+        Closes the devices that are not in use and expired.
+        """
+        with self.lock:
+            connections = list(self.connections.values())
+
+        now = time.time()
+        for connection in connections:
+            if not connection.lock.acquire(False):
+                # In use, so not idle
+                continue
+
+            try:
+                if connection.device and self.is_expired(connection, now):
+                    self.close(connection)
+            finally:
+                connection.lock.release()
+
+    def get_reap_interval(self):
+        # Expired devices are closed at most half of their timeout late
+        timeouts = [self.get_idle_timeout()]
+        if self.get_max_lifetime():
+            timeouts.append(self.get_max_lifetime())
+        return min(max(min(timeouts) / 2, 0.05), 60)
+
+    def reap(self):
+        """
+        Closes expired devices regularly, stops once no device is open.
+        """
+        while True:
+            time.sleep(self.get_reap_interval())
+            self.evict_idle()
+
+            with self.lock:
+                if not any(connection.device for connection in self.connections.values()):
+                    self.reaper = None
+                    return
+
+    def start_reaper(self):
+        with self.lock:
+            if self.reaper:
+                return
+
+            self.reaper = threading.Thread(target=self.reap)
+            self.reaper.daemon = True
+            self.reaper.start()
+
+    def close_all(self):
+        with self.lock:
+            connections = list(self.connections.values())
+            self.connections.clear()
+
+        for connection in connections:
+            with connection.lock:
+                self.close(connection)
+
+    def checkout(self, router, timeout=None):
+        """
+        Returns the connection of the router with an open device and its lock
+        held, opening a new device if needed. A device opened with another
+        timeout is not reused.
+        """
+        self.evict_idle()
+
+        fingerprint = (router.hostname, router.platform,
+                       timeout or settings.NAPALM_TIMEOUT)
+
+        with self.lock:
+            connection = self.connections.setdefault(
+                router.pk, PooledConnection())
+
+        connection.lock.acquire()
+        try:
+            if connection.device and (connection.fingerprint != fingerprint or
+                                      self.is_expired(connection) or
+                                      not self.is_alive(connection)):
+                self.close(connection)
+
+            if not connection.device:
+                device = router.get_napalm_device(timeout=timeout)
+                if not device:
+                    raise ValueError(
+                        'No NAPALM driver available for platform {}'.format(router.platform))
+
+                self.logger.debug('opening napalm connection to %s',
+                                  router.hostname)
+                device.open()
+
+                connection.device = device
+                connection.fingerprint = fingerprint
+                connection.opened = connection.last_used = time.time()
+        except Exception:
+            connection.lock.release()
+            raise
+
+        return connection
+
+    @contextmanager
+    def connection(self, router, timeout=None):
+        """
+        Yields an open NAPALM device for the given router. The device is
+        reserved to the caller until the end of the block.
+        """
+        connection = self.checkout(router, timeout=timeout)
+
+        try:
+            yield connection.device
+        except Exception:
+            # The state of the device is unknown, do not reuse it
+            self.close(connection)
+            raise
+        finally:
+            connection.last_used = time.time()
+            if self.is_expired(connection):
+                self.close(connection)
+            opened = connection.device is not None
+            connection.lock.release()
+
+            if opened:
+                self.start_reaper()
+
+
+pool = NAPALMConnectionPool()
+atexit.register(pool.close_all)
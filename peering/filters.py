@@ -122,6 +122,10 @@ class PeeringSessionFilter(django_filters.FilterSet):
         method='search',
         label='Search',
     )
+    ip_version = django_filters.MultipleChoiceFilter(
+        choices=PeeringSession.IP_VERSION_CHOICES,
+        label='IP Version',
+    )
 
     class Meta:
         model = PeeringSession
@@ -270,12 +270,16 @@ class PeeringSessionFilterForm(BootstrapMixin, forms.Form):
     autonomous_system__asn = forms.IntegerField(required=False, label='ASN')
     autonomous_system__name = forms.CharField(required=False, label='AS Name')
     ip_address = forms.CharField(required=False, label='IP Address')
+    ip_version = forms.MultipleChoiceField(
+        choices=PeeringSession.IP_VERSION_CHOICES, required=False, label='IP Version')
 
 
 class PeeringSessionFilterFormForAS(BootstrapMixin, forms.Form):
     model = PeeringSession
     q = forms.CharField(required=False, label='Search')
     ip_address = forms.CharField(required=False, label='IP Address')
+    ip_version = forms.MultipleChoiceField(
+        choices=PeeringSession.IP_VERSION_CHOICES, required=False, label='IP Version')
     internet_exchange__slug = FilterChoiceField(queryset=InternetExchange.objects.all(),
                                                 to_field_name='slug', label='Internet Exchange')
 
@@ -0,0 +1,48 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from peering.models import InternetExchange
+from peering.templating import generate_configurations
+
+
+class Command(BaseCommand):
+    help = 'Generate the configuration of all IXs, one file per IX.'
+    logger = logging.getLogger('peering.manager.templating')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output_directory',
+            help='Directory where the configuration files are written.')
+        parser.add_argument(
+            '--ix', action='append', dest='slugs', metavar='SLUG',
+            help='Only generate the configuration of this IX, can be repeated.')
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Number of processes used to render the configurations.')
+
+    def handle(self, *args, **options):
+        output_directory = options['output_directory']
+        if not os.path.isdir(output_directory):
+            raise CommandError(
+                'Directory {} does not exist.'.format(output_directory))
+
+        internet_exchanges = InternetExchange.objects.all()
+        if options['slugs']:
+            internet_exchanges = internet_exchanges.filter(
+                slug__in=options['slugs'])
+
+        self.logger.info('Generating configurations...')
+        configurations = generate_configurations(
+            internet_exchanges, processes=options['processes'])
+
+        for internet_exchange, configuration in configurations.items():
+            filename = os.path.join(output_directory,
+                                    '{}.conf'.format(internet_exchange.slug))
+            with open(filename, 'w') as output:
+                output.write(configuration)
+
+            self.stdout.write('{}: {}'.format(internet_exchange, filename))
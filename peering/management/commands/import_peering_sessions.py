@@ -0,0 +1,45 @@
+from __future__ import unicode_literals
+
+import logging
+
+from django.core.management.base import BaseCommand
+
+from peering.collectors import collect_bgp_sessions
+from peering.models import InternetExchange
+
+
+class Command(BaseCommand):
+    help = 'Import peering sessions from the routers connected to the IXs.'
+    logger = logging.getLogger('peering.manager.napalm')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of routers to connect to at the same time.')
+        parser.add_argument(
+            '--timeout', type=int, default=None,
+            help='Timeout in seconds for the operations on each router.')
+
+    def handle(self, *args, **options):
+        self.logger.info('Importing peering sessions from routers...')
+
+        internet_exchanges = InternetExchange.objects.filter(
+            router__isnull=False, peeringdb_id__isnull=False).exclude(
+            router__platform='').select_related('router')
+        routers = set(ix.router for ix in internet_exchanges)
+
+        collection = collect_bgp_sessions(routers,
+                                          max_workers=options['workers'],
+                                          timeout=options['timeout'])
+
+        for router, error in collection.failures.items():
+            self.stderr.write('{}: {}'.format(router, error))
+
+        for internet_exchange in internet_exchanges:
+            if internet_exchange.router not in collection.sessions:
+                continue
+
+            result = internet_exchange.import_peering_sessions_from_router(
+                bgp_sessions=collection.sessions[internet_exchange.router])
+            if result:
+                self.stdout.write('{}: {}'.format(internet_exchange, result))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.10 on 2026-10-18 02:55
+from __future__ import unicode_literals
+
+import ipaddress
+
+from django.db import migrations, models
+
+
+def set_ip_version(apps, schema_editor):
+    PeeringSession = apps.get_model('peering', 'PeeringSession')
+    db_alias = schema_editor.connection.alias
+
+    ids_by_version = {6: [], 4: []}
+    for id, ip_address in PeeringSession.objects.using(db_alias).values_list('id', 'ip_address'):
+        ids_by_version[ipaddress.ip_address(ip_address).version].append(id)
+
+    # Keep the number of query parameters low for SQLite
+    for ip_version, ids in ids_by_version.items():
+        for i in range(0, len(ids), 500):
+            PeeringSession.objects.using(db_alias).filter(
+                id__in=ids[i:i + 500]).update(ip_version=ip_version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('peering', '0010_auto_20171228_0158'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='peeringsession',
+            name='ip_version',
+            field=models.PositiveSmallIntegerField(choices=[(6, 'IPv6'), (4, 'IPv4')], db_index=True, default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_ip_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.10 on 2026-10-18 17:08
+from __future__ import unicode_literals
+
+from django.core.management.base import CommandError
+from django.db import migrations, models
+
+
+def check_duplicates(apps, schema_editor):
+    """
+    Stops the migration if an IP address is used by several peering sessions
+    of the same IX, the operator has to choose the ones to keep.
+    """
+    PeeringSession = apps.get_model('peering', 'PeeringSession')
+    db_alias = schema_editor.connection.alias
+
+    # IX names are not unique, they are only used to report the duplicates
+    sessions = {}
+    names = {}
+    for id, internet_exchange_id, name, ip_address in PeeringSession.objects.using(db_alias).order_by('id').values_list('id', 'internet_exchange_id', 'internet_exchange__name', 'ip_address'):
+        sessions.setdefault((internet_exchange_id, ip_address), []).append(id)
+        names[internet_exchange_id] = name
+
+    duplicates = ['{} on {} (IDs: {})'.format(ip_address, names[internet_exchange_id], ', '.join(str(id) for id in ids))
+                  for (internet_exchange_id, ip_address), ids in sorted(sessions.items())
+                  if len(ids) > 1]
+    if duplicates:
+        raise CommandError(
+            'Peering sessions must have distinct IP addresses within an IX, '
+            'delete or change the following ones and run the migration '
+            'again:\n' + '\n'.join(duplicates))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('peering', '0011_peeringsession_ip_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='peeringsession',
+            name='ip_address',
+            field=models.GenericIPAddressField(db_index=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='peeringsession',
+            unique_together=set([('internet_exchange', 'ip_address')]),
+        ),
+    ]
@@ -1,16 +1,55 @@
 from __future__ import unicode_literals
 
-from jinja2 import Template
 import ipaddress
 import napalm
 
 from django.conf import settings
-from django.db import models, transaction
+from django.core.exceptions import ValidationError
+from django.db import models
 from django.urls import reverse
 from django.utils import timezone
 
+from .connections import pool
 from .fields import ASNField, CommunityField
+from .prefixes import prefixes_cache
+from .reconciliation import PrefixClassifier, import_peering_sessions
+from .templating import configuration_cache, get_template
 from peeringdb.api import PeeringDB
+from peeringdb.models import NetworkIXLAN
+from peeringdb.prefixes import get_prefix_index
+from utils.cache import SharedCache
+
+
+# ASes returned by AutonomousSystem.does_exist() indexed by ASN, shared by all
+# processes as any of them may change an AS
+autonomous_system_cache = SharedCache('peering.autonomous_systems',
+                                      settings.LOOKUP_CACHE_TIMEOUT)
+
+
+# Peers of the IXs and counts of objects shown on the home page, shared by all
+# processes
+available_peers_cache = SharedCache('peering.peers')
+statistics_cache = SharedCache('peering.statistics')
+
+
+def get_autonomous_system_cache_statistics():
+    """
+    Returns the number of hits and misses of the AS lookups cache for this
+    process.
+    """
+    return autonomous_system_cache.get_statistics()
+
+
+class AutonomousSystemQuerySet(models.QuerySet):
+    def annotate_counts(self):
+        """
+        Annotates each AS with the number of its peering sessions and of the
+        IXs it is connected to, computed within the same query.
+        """
+        return self.annotate(
+            peering_sessions_count=models.Count('peeringsession', distinct=True),
+            internet_exchanges_count=models.Count(
+                'peeringsession__internet_exchange', distinct=True))
 
 
 class AutonomousSystem(models.Model):
@@ -22,15 +61,23 @@ class AutonomousSystem(models.Model):
     ipv4_max_prefixes = models.PositiveIntegerField(blank=True, null=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = AutonomousSystemQuerySet.as_manager()
+
     class Meta:
         ordering = ['asn']
 
     @staticmethod
     def does_exist(asn):
-        try:
-            return AutonomousSystem.objects.get(asn=asn)
-        except AutonomousSystem.DoesNotExist:
-            return None
+        def get():
+            try:
+                return AutonomousSystem.objects.get(asn=asn)
+            except AutonomousSystem.DoesNotExist:
+                return None
+
+        # An AS may be created by another process at any time, its absence
+        # is not remembered
+        return autonomous_system_cache.get_or_compute(
+            asn, get, store=lambda autonomous_system: autonomous_system is not None)
 
     @staticmethod
     def create_from_peeringdb(asn):
@@ -39,9 +86,8 @@ class AutonomousSystem(models.Model):
         if not peeringdb_network:
             return None
 
-        try:
-            return AutonomousSystem.objects.get(asn=peeringdb_network.asn)
-        except AutonomousSystem.DoesNotExist:
+        autonomous_system = AutonomousSystem.does_exist(peeringdb_network.asn)
+        if not autonomous_system:
             values = {
                 'asn': peeringdb_network.asn,
                 'name': peeringdb_network.name,
@@ -62,19 +108,21 @@ class AutonomousSystem(models.Model):
         return reverse('peering:as_details', kwargs={'asn': self.asn})
 
     def get_peering_sessions_count(self):
+        # Use the annotation if the AS comes from annotate_counts()
+        if hasattr(self, 'peering_sessions_count'):
+            return self.peering_sessions_count
         return self.peeringsession_set.count()
 
     def get_internet_exchanges(self):
-        internet_exchanges = []
-
-        for session in self.peeringsession_set.all():
-            if session.internet_exchange not in internet_exchanges:
-                internet_exchanges.append(session.internet_exchange)
-
-        return internet_exchanges
+        return InternetExchange.objects.filter(
+            peeringsession__autonomous_system=self).distinct()
 
     def get_internet_exchanges_count(self):
-        return len(self.get_internet_exchanges())
+        # Use the annotation if the AS comes from annotate_counts()
+        if hasattr(self, 'internet_exchanges_count'):
+            return self.internet_exchanges_count
+        return self.peeringsession_set.values(
+            'internet_exchange').distinct().count()
 
     def sync_with_peeringdb(self):
         peeringdb_info = PeeringDB().get_autonomous_system(self.asn)
@@ -128,6 +176,18 @@ class ConfigurationTemplate(models.Model):
         return self.name
 
 
+class InternetExchangeQuerySet(models.QuerySet):
+    def annotate_counts(self):
+        """
+        Annotates each IX with the number of its peering sessions and of the
+        ASes connected to it, computed within the same query.
+        """
+        return self.annotate(
+            peering_sessions_count=models.Count('peeringsession', distinct=True),
+            autonomous_systems_count=models.Count(
+                'peeringsession__autonomous_system', distinct=True))
+
+
 class InternetExchange(models.Model):
     peeringdb_id = models.PositiveIntegerField(blank=True, null=True)
     name = models.CharField(max_length=128)
@@ -141,6 +201,8 @@ class InternetExchange(models.Model):
         'Router', blank=True, null=True, on_delete=models.SET_NULL)
     communities = models.ManyToManyField('Community', blank=True)
 
+    objects = InternetExchangeQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
 
@@ -154,37 +216,88 @@ class InternetExchange(models.Model):
         return reverse('peering:ix_peers', kwargs={'slug': self.slug})
 
     def get_peering_sessions_count(self):
+        # Use the annotation if the IX comes from annotate_counts()
+        if hasattr(self, 'peering_sessions_count'):
+            return self.peering_sessions_count
         return self.peeringsession_set.count()
 
     def get_autonomous_systems(self):
-        autonomous_systems = []
-
-        for session in self.peeringsession_set.all():
-            if session.autonomous_system not in autonomous_systems:
-                autonomous_systems.append(session.autonomous_system)
-
-        return autonomous_systems
+        return AutonomousSystem.objects.filter(
+            peeringsession__internet_exchange=self).distinct()
 
     def get_autonomous_systems_count(self):
-        return len(self.get_autonomous_systems())
-
-    def get_prefixes(self):
-        return [] if not self.peeringdb_id else PeeringDB().get_prefixes_for_ix_network(self.peeringdb_id)
+        # Use the annotation if the IX comes from annotate_counts()
+        if hasattr(self, 'autonomous_systems_count'):
+            return self.autonomous_systems_count
+        return self.peeringsession_set.values(
+            'autonomous_system').distinct().count()
+
+    def get_prefixes(self, block=False):
+        """
+        Returns the prefixes of the IX. They are cached, if they are not and
+        block is False an empty list is returned while they are fetched in
+        the background, see is_retrieving_prefixes().
+        """
+        if not self.peeringdb_id:
+            return []
+
+        # Keep them for the lifetime of this object, templates can call this
+        # several times
+        prefixes = getattr(self, '_prefixes', None)
+        if prefixes is None:
+            prefixes = prefixes_cache.get(self.peeringdb_id, block=block)
+            self._prefixes = prefixes
+
+        return prefixes or []
+
+    def is_retrieving_prefixes(self):
+        """
+        Tells if the prefixes of the IX are being fetched in the background,
+        as opposed to the IX having no prefixes.
+        """
+        if not self.peeringdb_id:
+            return False
 
-    def get_config(self):
-        peering_sessions = self.peeringsession_set.all()
+        self.get_prefixes()
+        return self._prefixes is None
 
-        peering_sessions6 = []
-        peering_sessions4 = []
+    def get_prefix_classifier(self):
+        """
+        Returns an object telling if IP addresses are within the prefixes of
+        the IX LAN, using the prefix index. None is returned if the prefixes
+        of the IX LAN are not in the local PeeringDB cache.
+        """
+        if not self.peeringdb_id:
+            return None
 
-        # Sort peering sessions based on IP protocol version
-        for session in peering_sessions:
-            session_dict = session.to_dict()
+        ixlan_id = NetworkIXLAN.objects.filter(id=self.peeringdb_id).values_list(
+            'ixlan_id', flat=True).first()
+        prefix_index = get_prefix_index()
+        if not ixlan_id or not prefix_index.has_ixlan(ixlan_id):
+            return None
 
-            if session_dict['ip_version'] == 6:
-                peering_sessions6.append(session_dict)
-            if session_dict['ip_version'] == 4:
-                peering_sessions4.append(session_dict)
+        return prefix_index.get_classifier(ixlan_id)
+
+    def get_config_context(self, peering_sessions=None):
+        """
+        Returns the variables given to the configuration template. Peering
+        sessions of the IX can be given if they are already loaded (with
+        their autonomous systems).
+        """
+        if peering_sessions is None:
+            peering_sessions = self.peeringsession_set.select_related(
+                'autonomous_system')
+            # Sort peering sessions based on IP protocol version
+            peering_sessions6 = [session.to_dict() for session in peering_sessions.filter(
+                ip_version=PeeringSession.IP_VERSION_6)]
+            peering_sessions4 = [session.to_dict() for session in peering_sessions.filter(
+                ip_version=PeeringSession.IP_VERSION_4)]
+        else:
+            # Sort peering sessions based on IP protocol version
+            peering_sessions6 = [session.to_dict() for session in peering_sessions
+                                 if session.ip_version == PeeringSession.IP_VERSION_6]
+            peering_sessions4 = [session.to_dict() for session in peering_sessions
+                                 if session.ip_version == PeeringSession.IP_VERSION_4]
 
         peering_groups = [
             {'name': 'ipv6', 'sessions': peering_sessions6},
@@ -199,19 +312,27 @@ class InternetExchange(models.Model):
                 'value': community.value,
             })
 
-        values = {
+        return {
             'internet_exchange': self,
             'peering_groups': peering_groups,
             'communities': communities,
         }
 
-        # Load and render the template using Jinja2
-        configuration_template = Template(
-            self.configuration_template.template)
+    def render_config(self):
+        # Render the template, compiled only once, using Jinja2
+        return get_template(self.configuration_template).render(
+            self.get_config_context())
 
-        return configuration_template.render(values)
+    def get_config(self):
+        # Only render the configuration if something changed since the last
+        # time it was rendered
+        return configuration_cache.get_or_render(self, self.render_config)
 
     def get_available_peers(self):
+        """
+        Returns the peers of the IX found with PeeringDB, or None if they
+        cannot be retrieved.
+        """
         peers = []
 
         # Not linked to PeeringDB, cannot determine peers
@@ -221,14 +342,18 @@ class InternetExchange(models.Model):
         # Get the LAN that we are attached to and retrieve the peers
         api = PeeringDB()
         lan = api.get_ix_network(self.peeringdb_id)
+        if not lan:
+            return peers
         peeringdb_peers = api.get_peers_for_ix(lan.ix_id)
-        known_peerings = []
+        if peeringdb_peers is None:
+            return None
 
-        # Grab all addresses we are connected to
-        for session in self.peeringsession_set.all():
-            known_peerings.append(ipaddress.ip_address(session.ip_address))
+        # Grab all addresses we are connected to, the set makes membership
+        # tests constant time whatever the number of sessions is
+        known_peerings = set(ipaddress.ip_address(ip_address) for ip_address in
+                             self.peeringsession_set.values_list('ip_address', flat=True))
 
-        # Check if peers addresses are in the list of addresses we are already
+        # Check if peers addresses are in the set of addresses we are already
         # connected to.
         for peeringdb_peer in peeringdb_peers:
             peeringdb_peer['has_ipv6'] = True if peeringdb_peer['network_ixlan'].ipaddr6 else None
@@ -243,68 +368,88 @@ class InternetExchange(models.Model):
 
         return peers
 
-    def import_peering_sessions_from_router(self):
+    def import_peering_sessions_from_router(self, bgp_sessions=None):
+        """
+        Creates the peering sessions (and autonomous systems) found on the
+        router connected to the IX and returns a PeeringSessionsImport report.
+        BGP sessions already collected from the router can be given to avoid
+        connecting to it.
+        """
         # No point of discover from router if none used or not on a supported
         # platform or not linked to a PeeringDB record.
         if not self.router or not self.router.platform or not self.peeringdb_id:
             return None
 
-        number_of_peering_sessions = 0
-        number_of_autonomous_systems = 0
-        # Build a list based on prefixes based on PeeringDB records
-        prefixes = [ipaddress.ip_network(prefix['prefix'])
-                    for prefix in self.get_prefixes()]
         # Gather all existing BGP sessions from the router connected to the IX
-        bgp_sessions = self.router.get_bgp_sessions()
-
-        with transaction.atomic():
-            # For each BGP session check if the address fits in on of the prefixes
-            for bgp_session in bgp_sessions:
-                for prefix in prefixes:
-                    # If the address fits, create a new PeeringSession object and a
-                    # new AutonomousSystem object if they does not exist already
-                    if bgp_session['ip_address'] in prefix:
-                        if not PeeringSession.does_exist(str(bgp_session['ip_address'])):
-                            autonomous_system = AutonomousSystem.does_exist(
-                                bgp_session['remote_asn'])
-                            if not autonomous_system:
-                                autonomous_system = AutonomousSystem.create_from_peeringdb(
-                                    bgp_session['remote_asn'])
-                                number_of_autonomous_systems += 1
-
-                            values = {
-                                'autonomous_system': autonomous_system,
-                                'internet_exchange': self,
-                                'ip_address': str(bgp_session['ip_address']),
-                            }
-                            peering_session = PeeringSession(**values)
-                            peering_session.save()
-                            number_of_peering_sessions += 1
-
-        return (number_of_autonomous_systems, number_of_peering_sessions)
+        if bgp_sessions is None:
+            bgp_sessions = self.router.get_bgp_sessions()
+
+        # Fallback on the prefixes fetched from PeeringDB if they are not
+        # cached
+        classifier = self.get_prefix_classifier()
+        if not classifier:
+            classifier = PrefixClassifier(
+                [prefix['prefix'] for prefix in self.get_prefixes(block=True)])
+
+        return import_peering_sessions(self, bgp_sessions, classifier)
 
     def __str__(self):
         return self.name
 
 
 class PeeringSession(models.Model):
+    # IP version constants, stored to avoid parsing addresses
+    IP_VERSION_6 = 6
+    IP_VERSION_4 = 4
+    IP_VERSION_CHOICES = (
+        (IP_VERSION_6, 'IPv6'),
+        (IP_VERSION_4, 'IPv4'),
+    )
+
     autonomous_system = models.ForeignKey(
         'AutonomousSystem', on_delete=models.CASCADE)
     internet_exchange = models.ForeignKey(
         'InternetExchange', on_delete=models.CASCADE)
-    ip_address = models.GenericIPAddressField()
+    ip_address = models.GenericIPAddressField(db_index=True)
+    ip_version = models.PositiveSmallIntegerField(
+        choices=IP_VERSION_CHOICES, editable=False, db_index=True)
     comment = models.TextField(blank=True)
 
+    class Meta:
+        unique_together = ('internet_exchange', 'ip_address')
+
     @staticmethod
     def does_exist(ip_address):
+        return PeeringSession.objects.filter(ip_address=ip_address).exists()
+
+    @staticmethod
+    def get_ip_version(ip_address):
+        return ipaddress.ip_address(str(ip_address)).version
+
+    def clean(self):
+        if not self.ip_address or not self.internet_exchange_id:
+            return
+
         try:
-            PeeringSession.objects.get(ip_address=ip_address)
-        except PeeringSession.DoesNotExist:
-            return False
-        return True
+            ip_address = ipaddress.ip_address(str(self.ip_address))
+        except ValueError:
+            # Already reported by the field validation
+            return
+
+        # Only checked if the prefixes of the IX are known
+        classifier = self.internet_exchange.get_prefix_classifier()
+        if classifier and ip_address not in classifier:
+            raise ValidationError({
+                'ip_address': 'This address is not within the prefixes of {}.'.format(
+                    self.internet_exchange),
+            })
+
+    def save(self, *args, **kwargs):
+        self.ip_version = self.get_ip_version(self.ip_address)
+        super(PeeringSession, self).save(*args, **kwargs)
 
     def to_dict(self):
-        ip_version = ipaddress.ip_address(str(self.ip_address)).version
+        ip_version = self.ip_version
 
         # Enforce max prefixes to be set to 0 by default
         max_prefixes = 0
@@ -353,79 +498,81 @@ class Router(models.Model):
     def get_absolute_url(self):
         return reverse('peering:router_details', kwargs={'id': self.id})
 
-    def get_napalm_device(self):
+    def get_napalm_device(self, timeout=None):
         try:
             # Driver found, instanciate it
             driver = napalm.get_network_driver(self.platform)
             return driver(hostname=self.hostname,
                           username=settings.NAPALM_USERNAME,
                           password=settings.NAPALM_PASSWORD,
-                          timeout=settings.NAPALM_TIMEOUT,
+                          timeout=timeout or settings.NAPALM_TIMEOUT,
                           optional_args=settings.NAPALM_ARGS)
         except napalm.base.exceptions.ModuleImportError:
             # Unable to import proper driver from napalm
             # Most probably due to a broken install
             return None
 
+    def napalm_connection(self, timeout=None):
+        """
+        Returns a context manager giving an open NAPALM device for the router.
+        Devices are kept open in a pool to be reused by later operations.
+        """
+        return pool.connection(self, timeout=timeout)
+
     def test_napalm_connection(self):
-        device = self.get_napalm_device()
         success = False
 
-        if device:
-            try:
-                # Open and close the connection just for test
-                device.open()
-                device.close()
-
+        try:
+            # Get a working connection just for test
+            with self.napalm_connection():
                 success = True
-            except Exception:
-                pass
+        except Exception:
+            pass
 
         return success
 
     def set_configuration(self, config, commit=False):
         try:
             # Connect to the device
-            device = self.get_napalm_device()
-            device.open()
-
-            # Load the config and get the diff
-            device.load_merge_candidate(config=config)
-            changes = device.compare_config()
-
-            # Commit the config if needed
-            if commit:
-                device.commit_config()
-            else:
-                device.discard_config()
-
-            device.close()
+            with self.napalm_connection() as device:
+                # Load the config and get the diff
+                device.load_merge_candidate(config=config)
+                changes = device.compare_config()
+
+                # Commit the config if needed
+                if commit:
+                    device.commit_config()
+                else:
+                    device.discard_config()
         except Exception:
             changes = None
 
         # Return the config diff
         return changes
 
-    def get_bgp_sessions(self):
+    def fetch_bgp_sessions(self, timeout=None):
+        """
+        Returns the BGP sessions configured on the router. Unlike
+        get_bgp_sessions(), errors are not hidden but raised.
+        """
+        with self.napalm_connection(timeout=timeout) as device:
+            bgp_neighbors = device.get_bgp_neighbors()
+
         bgp_sessions = []
+        for vrf in bgp_neighbors:
+            for ip, details in bgp_neighbors[vrf]['peers'].items():
+                bgp_sessions.append({
+                    'ip_address': ipaddress.ip_address(ip),
+                    'remote_asn': details['remote_as'],
+                })
 
-        try:
-            device = self.get_napalm_device()
-            device.open()
+        return bgp_sessions
 
-            bgp_neighbors = device.get_bgp_neighbors()
-            for vrf in bgp_neighbors:
-                for ip, details in bgp_neighbors[vrf]['peers']:
-                    bgp_sessions.append({
-                        'ip_address': ipaddress.ip_address(ip),
-                        'remote_asn': details['remote_as'],
-                    })
-
-            device.close()
+    def get_bgp_sessions(self):
+        try:
+            return self.fetch_bgp_sessions()
         except Exception:
-            bgp_sessions = []
-
-        return bgp_sessions
+            return []
 
     def __str__(self):
         return self.name
@@ -0,0 +1,90 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from peeringdb.api import PeeringDB
+
+
+class PrefixesCache(object):
+    """
+    Cache of the prefixes of IX LANs found with PeeringDB. Entries expire
+    after PREFIXES_CACHE_TIMEOUT seconds, or PEERINGDB_MISSING_TIMEOUT seconds
+    if no prefixes were found, and are not used anymore once a new PeeringDB
+    synchronization has been recorded.
+
+    Lookups can be made without blocking: on a miss None is returned and the
+    prefixes are fetched by a background thread, the following lookups will
+    find them in the cache.
+    """
+    logger = logging.getLogger('peering.manager.peeringdb')
+    key_prefix = 'peering.prefixes'
+
+    def __init__(self):
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def get_key(self, ix_network_id):
+        # The time of the last synchronization invalidates older entries
+        return '{}.{}.{}'.format(self.key_prefix, ix_network_id,
+                                 PeeringDB().get_last_sync_time())
+
+    def fetch(self, ix_network_id, key):
+        prefixes = PeeringDB().get_prefixes_for_ix_network(ix_network_id)
+
+        # Nothing found may be a failure, look again sooner
+        if prefixes:
+            cache.set(key, prefixes, settings.PREFIXES_CACHE_TIMEOUT)
+        else:
+            cache.set(key, prefixes, settings.PEERINGDB_MISSING_TIMEOUT)
+
+        return prefixes
+
+    def fetch_in_background(self, ix_network_id, key):
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+
+        def run():
+            try:
+                self.fetch(ix_network_id, key)
+            except Exception:
+                self.logger.exception('cannot fetch prefixes of %s',
+                                      ix_network_id)
+            finally:
+                # The thread has its own database connection
+                connection.close()
+                with self.lock:
+                    self.pending.discard(key)
+
+        self.logger.debug('fetching prefixes of %s in background',
+                          ix_network_id)
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def get(self, ix_network_id, block=True):
+        """
+        Returns the prefixes of an IX LAN given the ID of a PeeringDB IX
+        network. If they are not cached and block is False, None is returned
+        instead of waiting for them.
+        """
+        key = self.get_key(ix_network_id)
+
+        prefixes = cache.get(key)
+        if prefixes is not None:
+            return prefixes
+
+        if block:
+            return self.fetch(ix_network_id, key)
+
+        self.fetch_in_background(ix_network_id, key)
+        return None
+
+
+prefixes_cache = PrefixesCache()
@@ -0,0 +1,212 @@
+from __future__ import unicode_literals
+
+import bisect
+import ipaddress
+import logging
+
+from collections import OrderedDict, defaultdict
+
+from django.db import transaction
+
+from peeringdb.api import SYNC_CHUNK_SIZE, PeeringDB, chunked
+
+
+class PrefixClassifier(object):
+    """
+    Tells if IP addresses are part of a set of prefixes. Prefixes are merged
+    into sorted and non-overlapping intervals, one list per IP version, so
+    each lookup is a binary search.
+    """
+
+    def __init__(self, prefixes):
+        networks = defaultdict(list)
+        for prefix in prefixes:
+            network = ipaddress.ip_network(prefix)
+            networks[network.version].append(network)
+
+        self.starts = {}
+        self.ends = {}
+        for version, version_networks in networks.items():
+            collapsed = list(ipaddress.collapse_addresses(version_networks))
+            self.starts[version] = [int(n.network_address) for n in collapsed]
+            self.ends[version] = [int(n.broadcast_address) for n in collapsed]
+
+    def __contains__(self, ip_address):
+        ip_address = ipaddress.ip_address(ip_address)
+        starts = self.starts.get(ip_address.version, [])
+
+        # Last interval starting before the address
+        index = bisect.bisect_right(starts, int(ip_address)) - 1
+
+        return index >= 0 and int(ip_address) <= self.ends[ip_address.version][index]
+
+
+class PeeringSessionsImport(object):
+    """
+    Report of an import of peering sessions for an IX. Every BGP session
+    given to the import ends up in exactly one of the lists.
+    """
+
+    def __init__(self, internet_exchange):
+        self.internet_exchange = internet_exchange
+        # Objects created by the import
+        self.autonomous_systems = []
+        self.peering_sessions = []
+        # IP addresses of the BGP sessions that have not been imported
+        self.existing = []
+        self.outside_prefixes = []
+        self.unknown_asns = OrderedDict()
+
+    @property
+    def autonomous_systems_count(self):
+        return len(self.autonomous_systems)
+
+    @property
+    def peering_sessions_count(self):
+        return len(self.peering_sessions)
+
+    def __str__(self):
+        return '{} autonomous systems and {} peering sessions imported, {} already existing, {} outside of the IX prefixes, {} with an unknown AS'.format(
+            self.autonomous_systems_count, self.peering_sessions_count,
+            len(self.existing), len(self.outside_prefixes),
+            sum(len(ip_addresses) for ip_addresses in self.unknown_asns.values()))
+
+
+class PeeringSessionsReconciler(object):
+    """
+    Class used to create the peering sessions found on a router for an IX.
+
+    Work is done with a fixed number of queries: BGP sessions are classified
+    in memory with the given classifier (a PrefixClassifier or an IX LAN
+    classifier of the prefix index), existing sessions and ASes are loaded
+    with one query each, unknown ASes are fetched from PeeringDB in one
+    lookup and new objects are inserted in bulk.
+    """
+    logger = logging.getLogger('peering.manager.napalm')
+
+    def __init__(self, internet_exchange, classifier):
+        self.internet_exchange = internet_exchange
+        self.classifier = classifier
+
+    def classify(self, bgp_sessions, report):
+        """
+        Returns an ordered dict of the ASN of each BGP session within the IX
+        prefixes indexed by IP address.
+        """
+        candidates = OrderedDict()
+
+        for bgp_session in bgp_sessions:
+            ip_address = ipaddress.ip_address(bgp_session['ip_address'])
+
+            if ip_address not in self.classifier:
+                report.outside_prefixes.append(str(ip_address))
+                continue
+
+            # A neighbor can be found in several VRFs, keep the first one
+            candidates.setdefault(str(ip_address), bgp_session['remote_asn'])
+
+        return candidates
+
+    def get_autonomous_systems(self, asns, report):
+        """
+        Returns a dict of ASes indexed by ASN, ASes that are not known yet are
+        created using PeeringDB details.
+        """
+        from .models import AutonomousSystem, autonomous_system_cache
+
+        autonomous_systems = {}
+        for chunk in chunked(asns, SYNC_CHUNK_SIZE):
+            for autonomous_system in AutonomousSystem.objects.filter(asn__in=chunk):
+                autonomous_systems[autonomous_system.asn] = autonomous_system
+
+        missing_asns = set(asns).difference(autonomous_systems)
+        if not missing_asns:
+            return autonomous_systems
+
+        networks = PeeringDB().get_autonomous_systems(missing_asns)
+        AutonomousSystem.objects.bulk_create([
+            AutonomousSystem(asn=network.asn, name=network.name,
+                             irr_as_set=network.irr_as_set,
+                             ipv6_max_prefixes=network.info_prefixes6,
+                             ipv4_max_prefixes=network.info_prefixes4)
+            for network in networks.values()
+        ])
+        # No signals are sent by bulk_create()
+        autonomous_system_cache.invalidate()
+
+        # Primary keys are not set by bulk_create() with every database
+        for chunk in chunked(networks, SYNC_CHUNK_SIZE):
+            for autonomous_system in AutonomousSystem.objects.filter(asn__in=chunk).order_by('asn'):
+                autonomous_systems[autonomous_system.asn] = autonomous_system
+                report.autonomous_systems.append(autonomous_system)
+
+        return autonomous_systems
+
+    def reconcile(self, bgp_sessions):
+        """
+        Creates the missing peering sessions for the given BGP sessions and
+        returns a PeeringSessionsImport report.
+        """
+        from .models import (PeeringSession, available_peers_cache,
+                             statistics_cache)
+        from .templating import configuration_cache
+
+        report = PeeringSessionsImport(self.internet_exchange)
+        candidates = self.classify(bgp_sessions, report)
+
+        with transaction.atomic():
+            # IP addresses are unique within an IX
+            existing = set()
+            for chunk in chunked(candidates, SYNC_CHUNK_SIZE):
+                existing.update(PeeringSession.objects.filter(
+                    internet_exchange=self.internet_exchange,
+                    ip_address__in=chunk).values_list('ip_address', flat=True))
+
+            new_sessions = OrderedDict()
+            for ip_address, asn in candidates.items():
+                if ip_address in existing:
+                    report.existing.append(ip_address)
+                else:
+                    new_sessions[ip_address] = asn
+
+            autonomous_systems = self.get_autonomous_systems(
+                set(new_sessions.values()), report)
+
+            peering_sessions = []
+            for ip_address, asn in new_sessions.items():
+                if asn not in autonomous_systems:
+                    report.unknown_asns.setdefault(asn, []).append(ip_address)
+                    continue
+
+                # bulk_create() does not call save(), set the version here
+                peering_sessions.append(PeeringSession(
+                    autonomous_system=autonomous_systems[asn],
+                    internet_exchange=self.internet_exchange,
+                    ip_address=ip_address,
+                    ip_version=PeeringSession.get_ip_version(ip_address)))
+
+            PeeringSession.objects.bulk_create(peering_sessions)
+            report.peering_sessions.extend(peering_sessions)
+
+        # Signals are not sent by bulk_create()
+        if peering_sessions:
+            configuration_cache.invalidate([self.internet_exchange.pk])
+            available_peers_cache.invalidate()
+        if peering_sessions or report.autonomous_systems:
+            statistics_cache.invalidate()
+
+        for asn, ip_addresses in report.unknown_asns.items():
+            self.logger.warning('cannot find AS%s in peeringdb, not importing %s',
+                                asn, ', '.join(ip_addresses))
+        self.logger.info('%s: %s', self.internet_exchange, report)
+
+        return report
+
+
+def import_peering_sessions(internet_exchange, bgp_sessions, classifier):
+    """
+    Creates the peering sessions (and autonomous systems) of an IX from the
+    given BGP sessions whose addresses are in the classifier and returns a
+    PeeringSessionsImport report.
+    """
+    return PeeringSessionsReconciler(internet_exchange, classifier).reconcile(bgp_sessions)
@@ -0,0 +1,80 @@
+from __future__ import unicode_literals
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (AutonomousSystem, Community, ConfigurationTemplate,
+                     InternetExchange, PeeringSession, Router,
+                     autonomous_system_cache, available_peers_cache,
+                     statistics_cache)
+from .templating import configuration_cache
+
+
+# Models counted on the home page
+STATISTICS_MODELS = (AutonomousSystem, Community, ConfigurationTemplate,
+                     InternetExchange, PeeringSession, Router)
+
+
+@receiver([post_save, post_delete], sender=InternetExchange)
+def invalidate_internet_exchange_configuration(sender, instance, **kwargs):
+    configuration_cache.invalidate([instance.pk])
+
+
+@receiver(m2m_changed, sender=InternetExchange.communities.through)
+def invalidate_internet_exchange_communities(sender, instance, reverse, pk_set, **kwargs):
+    if reverse:
+        # Communities changed from the community side
+        configuration_cache.invalidate(pk_set or [])
+    else:
+        configuration_cache.invalidate([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=PeeringSession)
+def invalidate_peering_session_configuration(sender, instance, **kwargs):
+    configuration_cache.invalidate([instance.internet_exchange_id])
+
+
+@receiver([post_save, post_delete], sender=AutonomousSystem)
+def invalidate_autonomous_system_configuration(sender, instance, **kwargs):
+    configuration_cache.invalidate(PeeringSession.objects.filter(
+        autonomous_system_id=instance.pk).values_list('internet_exchange_id', flat=True).distinct())
+
+
+@receiver([post_save, post_delete], sender=AutonomousSystem)
+def invalidate_autonomous_system_lookups(sender, instance, **kwargs):
+    # The ASN itself may have changed, the old one cannot be known
+    autonomous_system_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Community)
+def invalidate_community_configuration(sender, instance, **kwargs):
+    configuration_cache.invalidate(InternetExchange.objects.filter(
+        communities__id=instance.pk).values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=ConfigurationTemplate)
+def invalidate_configuration_template_configuration(sender, instance, **kwargs):
+    configuration_cache.invalidate(InternetExchange.objects.filter(
+        configuration_template_id=instance.pk).values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=InternetExchange)
+@receiver([post_save, post_delete], sender=PeeringSession)
+def invalidate_available_peers(sender, instance, **kwargs):
+    available_peers_cache.invalidate()
+
+
+def invalidate_statistics_on_creation(sender, instance, created, **kwargs):
+    if created:
+        statistics_cache.invalidate()
+
+
+def invalidate_statistics_on_deletion(sender, instance, **kwargs):
+    statistics_cache.invalidate()
+
+
+# Receivers are connected to the counted models only, a post_delete receiver
+# prevents Django from deleting objects in bulk
+for model in STATISTICS_MODELS:
+    post_save.connect(invalidate_statistics_on_creation, sender=model)
+    post_delete.connect(invalidate_statistics_on_deletion, sender=model)
@@ -32,13 +32,16 @@ class AutonomousSystemTable(BaseTable):
     irr_as_set = tables.Column(verbose_name='IRR AS-SET', orderable=False)
     ipv6_max_prefixes = tables.Column(verbose_name='IPv6 Max Prefixes')
     ipv4_max_prefixes = tables.Column(verbose_name='IPv4 Max Prefixes')
+    peering_sessions_count = tables.Column(verbose_name='Sessions')
+    internet_exchanges_count = tables.Column(verbose_name='IXs')
     details = tables.TemplateColumn(verbose_name=' ',
                                     template_code='<div class="pull-right"><a href="{% url \'peering:as_details\' asn=record.asn %}" class="btn btn-xs btn-info"><span class="fa fa-info-circle" aria-hidden="true"></span> Details</a></div>', orderable=False)
 
     class Meta(BaseTable.Meta):
         model = AutonomousSystem
         fields = ('asn', 'name', 'irr_as_set', 'ipv6_max_prefixes',
-                  'ipv4_max_prefixes', 'details',)
+                  'ipv4_max_prefixes', 'peering_sessions_count',
+                  'internet_exchanges_count', 'details',)
 
 
 class CommunityTable(BaseTable):
@@ -72,13 +75,16 @@ class InternetExchangeTable(BaseTable):
     ipv6_address = tables.Column(verbose_name='IPv6 Address')
     ipv4_address = tables.Column(verbose_name='IPv4 Address')
     configuration_template = tables.Column(verbose_name='Template')
+    peering_sessions_count = tables.Column(verbose_name='Sessions')
+    autonomous_systems_count = tables.Column(verbose_name='ASes')
     details = tables.TemplateColumn(verbose_name=' ',
                                     template_code='<div class="pull-right"><a href="{% url \'peering:ix_details\' slug=record.slug %}" class="btn btn-xs btn-info"><span class="fa fa-info-circle" aria-hidden="true"></span> Details</a></div>', orderable=False)
 
     class Meta(BaseTable.Meta):
         model = InternetExchange
         fields = ('name', 'ipv6_address', 'ipv4_address',
-                  'configuration_template', 'router', 'details',)
+                  'configuration_template', 'router', 'peering_sessions_count',
+                  'autonomous_systems_count', 'details',)
 
 
 class PeeringSessionTable(BaseTable):
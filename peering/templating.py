@@ -0,0 +1,227 @@
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import multiprocessing
+import threading
+
+from collections import OrderedDict
+
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, TemplateNotFound
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from utils.cache import SharedCache
+
+
+class ConfigurationTemplateLoader(BaseLoader):
+    """
+    Jinja2 loader for ConfigurationTemplate objects. Template names are
+    built by get_template_name() and contain the time of the last update of
+    the template so a modified template is never mistaken for its previous
+    version.
+    """
+
+    def get_source(self, environment, template):
+        from .models import ConfigurationTemplate
+
+        try:
+            configuration_template = ConfigurationTemplate.objects.get(
+                pk=int(template.split(':')[0]))
+        except (ValueError, ConfigurationTemplate.DoesNotExist):
+            raise TemplateNotFound(template)
+
+        # Names are versioned, a loaded template never needs to be reloaded
+        return configuration_template.template, None, lambda: True
+
+
+def get_template_name(configuration_template):
+    return '{}:{}'.format(configuration_template.pk,
+                          configuration_template.updated.isoformat())
+
+
+_environment = None
+
+
+def get_environment():
+    """
+    Returns the Jinja2 environment shared by the whole process. It keeps the
+    JINJA2_CACHE_SIZE most recently used templates compiled in memory and, if
+    JINJA2_BYTECODE_CACHE_DIR is set, stores the compiled bytecode on disk so
+    new processes do not have to compile templates again.
+    """
+    global _environment
+
+    if _environment is None:
+        bytecode_cache = None
+        if settings.JINJA2_BYTECODE_CACHE_DIR:
+            bytecode_cache = FileSystemBytecodeCache(
+                settings.JINJA2_BYTECODE_CACHE_DIR, 'peering-manager-%s.cache')
+
+        _environment = Environment(loader=ConfigurationTemplateLoader(),
+                                   bytecode_cache=bytecode_cache,
+                                   cache_size=settings.JINJA2_CACHE_SIZE,
+                                   auto_reload=False)
+
+    return _environment
+
+
+def get_template(configuration_template):
+    """
+    Returns the compiled Jinja2 template of a ConfigurationTemplate, it is
+    only compiled the first time it is requested.
+    """
+    return get_environment().get_template(
+        get_template_name(configuration_template))
+
+
+class ConfigurationCache(object):
+    """
+    Cache of the configurations rendered for IXs. There is one entry per IX
+    holding the rendered configuration along with the fingerprint of the data
+    it was rendered from. An entry is only used if the fingerprint of the
+    current data is the same, entries are also removed when relevant objects
+    are saved or deleted.
+    """
+    logger = logging.getLogger('peering.manager.templating')
+
+    def __init__(self):
+        self.cache = SharedCache('peering.configuration')
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_key(self, internet_exchange_id):
+        return self.cache.get_key(internet_exchange_id)
+
+    def get_fingerprint(self, internet_exchange):
+        """
+        Returns a digest of everything used to render the configuration of
+        the given IX, computed with two queries.
+        """
+        template = internet_exchange.configuration_template
+        sessions = internet_exchange.peeringsession_set.order_by('id').values_list(
+            'id', 'ip_address', 'autonomous_system__asn',
+            'autonomous_system__name', 'autonomous_system__ipv6_max_prefixes',
+            'autonomous_system__ipv4_max_prefixes')
+        communities = internet_exchange.communities.order_by('id').values_list(
+            'name', 'value')
+
+        data = repr((
+            template.id if template else None,
+            template.updated.isoformat() if template else None,
+            internet_exchange.name, internet_exchange.slug,
+            internet_exchange.ipv6_address, internet_exchange.ipv4_address,
+            list(sessions), list(communities),
+        ))
+
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_statistics(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            }
+
+    def get_or_render(self, internet_exchange, render):
+        """
+        Returns the configuration of the IX from the cache if it is still up
+        to date, otherwise it is rendered with the given function and cached.
+        """
+        key = self.get_key(internet_exchange.pk)
+        fingerprint = self.get_fingerprint(internet_exchange)
+
+        entry = cache.get(key)
+        if entry and entry[0] == fingerprint:
+            self.record(True)
+            return entry[1]
+
+        self.record(False)
+        self.logger.debug('rendering configuration for %s', internet_exchange)
+
+        configuration = render()
+        cache.set(key, (fingerprint, configuration),
+                  settings.CONFIGURATION_CACHE_TIMEOUT)
+
+        return configuration
+
+    def invalidate(self, internet_exchange_ids):
+        cache.delete_many([self.get_key(internet_exchange_id)
+                           for internet_exchange_id in internet_exchange_ids])
+
+
+configuration_cache = ConfigurationCache()
+
+
+def get_configuration_cache_statistics():
+    """
+    Returns the number of hits and misses of the configuration cache for
+    this process.
+    """
+    return configuration_cache.get_statistics()
+
+
+def _render(job):
+    template_name, context = job
+    return get_environment().get_template(template_name).render(context)
+
+
+def generate_configurations(internet_exchanges=None, processes=None):
+    """
+    Renders the configuration of several IXs in one pass and returns an
+    ordered dict of configurations indexed by IX. All IXs with a template are
+    used if none are given.
+
+    Peering sessions of all IXs are loaded with a single query and grouped in
+    memory. If a number of processes is given, templates are rendered by a
+    pool of processes.
+    """
+    from .models import InternetExchange, PeeringSession
+
+    if internet_exchanges is None:
+        internet_exchanges = InternetExchange.objects.all()
+    internet_exchanges = list(internet_exchanges.filter(
+        configuration_template__isnull=False).select_related(
+        'configuration_template').prefetch_related('communities'))
+
+    # Get all sessions at once and group them by IX
+    peering_sessions = OrderedDict((ix.pk, []) for ix in internet_exchanges)
+    for session in PeeringSession.objects.filter(
+            internet_exchange__in=internet_exchanges).select_related(
+            'autonomous_system', 'internet_exchange'):
+        peering_sessions[session.internet_exchange_id].append(session)
+
+    jobs = []
+    for internet_exchange in internet_exchanges:
+        # Compile each template before the pool is created so that worker
+        # processes inherit them
+        get_template(internet_exchange.configuration_template)
+        jobs.append((get_template_name(internet_exchange.configuration_template),
+                     internet_exchange.get_config_context(
+                         peering_sessions=peering_sessions[internet_exchange.pk])))
+
+    if processes and processes > 1 and len(jobs) > 1:
+        # Database connections must not be shared with forked processes
+        connections.close_all()
+        worker_pool = multiprocessing.Pool(processes)
+        try:
+            configurations = worker_pool.map(_render, jobs)
+        finally:
+            worker_pool.close()
+            worker_pool.join()
+    else:
+        configurations = [_render(job) for job in jobs]
+
+    return OrderedDict(zip(internet_exchanges, configurations))
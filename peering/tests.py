@@ -1,3 +1,747 @@
-from django.test import TestCase
+from __future__ import unicode_literals
 
-# Create your tests here.
+import ipaddress
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db.models.deletion import Collector
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .collectors import collect_bgp_sessions
+from .connections import NAPALMConnectionPool, pool
+from .models import (AutonomousSystem, Community, ConfigurationTemplate,
+                     InternetExchange, PeeringSession, Router,
+                     autonomous_system_cache)
+from .prefixes import prefixes_cache
+from .reconciliation import PrefixClassifier, import_peering_sessions
+from . import templating
+from .templating import configuration_cache, generate_configurations, get_template
+from peeringdb.api import PeeringDB
+from peeringdb.models import InternetExchange as PeeringDBInternetExchange
+from peeringdb.models import (Network, NetworkIXLAN, Organization, Prefix,
+                              Synchronization, SynchronizationCheckpoint)
+from peeringdb.prefixes import prefix_index
+
+
+class CountsTestCase(TestCase):
+    def setUp(self):
+        self.internet_exchanges = [
+            InternetExchange.objects.create(name='IX {}'.format(i),
+                                            slug='ix-{}'.format(i))
+            for i in range(2)]
+        self.autonomous_systems = [
+            AutonomousSystem.objects.create(asn=64501 + i,
+                                            name='AS{}'.format(64501 + i))
+            for i in range(3)]
+
+        # First AS on both IXs with two sessions on the first one, second AS
+        # on the first IX only, third AS without any sessions
+        for internet_exchange, autonomous_system, ip_address in [
+                (0, 0, '2001:db8::1'), (0, 0, '192.0.2.1'),
+                (1, 0, '2001:db8:1::1'), (0, 1, '2001:db8::2')]:
+            PeeringSession.objects.create(
+                internet_exchange=self.internet_exchanges[internet_exchange],
+                autonomous_system=self.autonomous_systems[autonomous_system],
+                ip_address=ip_address)
+
+    def test_autonomous_system_counts(self):
+        with self.assertNumQueries(1):
+            counts = [(a.asn, a.get_peering_sessions_count(),
+                       a.get_internet_exchanges_count())
+                      for a in AutonomousSystem.objects.annotate_counts().order_by('asn')]
+        self.assertEqual(counts, [(64501, 3, 2), (64502, 1, 1), (64503, 0, 0)])
+
+        autonomous_system = AutonomousSystem.objects.get(asn=64501)
+        self.assertEqual(autonomous_system.get_peering_sessions_count(), 3)
+        self.assertEqual(autonomous_system.get_internet_exchanges_count(), 2)
+        self.assertEqual(list(autonomous_system.get_internet_exchanges().order_by('name')),
+                         self.internet_exchanges)
+
+    def test_internet_exchange_counts(self):
+        with self.assertNumQueries(1):
+            counts = [(ix.slug, ix.get_peering_sessions_count(),
+                       ix.get_autonomous_systems_count())
+                      for ix in InternetExchange.objects.annotate_counts().order_by('name')]
+        self.assertEqual(counts, [('ix-0', 3, 2), ('ix-1', 1, 1)])
+
+        internet_exchange = self.internet_exchanges[0]
+        self.assertEqual(internet_exchange.get_peering_sessions_count(), 3)
+        self.assertEqual(internet_exchange.get_autonomous_systems_count(), 2)
+        self.assertEqual(list(internet_exchange.get_autonomous_systems().order_by('asn')),
+                         self.autonomous_systems[:2])
+
+
+class AutonomousSystemTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_does_exist(self):
+        hits = autonomous_system_cache.get_statistics()['hits']
+
+        # The absence of an AS is not remembered, another process may create
+        # it without invalidating the cache of this one
+        self.assertIsNone(AutonomousSystem.does_exist(64501))
+        AutonomousSystem.objects.bulk_create([AutonomousSystem(asn=64501, name='AS')])
+        autonomous_system = AutonomousSystem.objects.get(asn=64501)
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.assertEqual(AutonomousSystem.does_exist(64501), autonomous_system)
+
+        # Changing or deleting the AS invalidates the cache
+        autonomous_system.asn = 64502
+        autonomous_system.save()
+        self.assertIsNone(AutonomousSystem.does_exist(64501))
+        self.assertEqual(AutonomousSystem.does_exist(64502).name, 'AS')
+
+        autonomous_system.delete()
+        self.assertIsNone(AutonomousSystem.does_exist(64502))
+
+        self.assertEqual(autonomous_system_cache.get_statistics()['hits'] - hits, 2)
+
+
+class HomeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_statistics(self):
+        AutonomousSystem.objects.create(asn=64501, name='AS')
+
+        response = self.client.get('/')
+        self.assertEqual(response.context['statistics']['as_count'], 1)
+
+        # Counts are cached, creating an object invalidates them
+        with patch.object(AutonomousSystem.objects, 'count') as count:
+            self.client.get('/')
+        count.assert_not_called()
+
+        AutonomousSystem.objects.create(asn=64502, name='AS')
+        response = self.client.get('/')
+        self.assertEqual(response.context['statistics']['as_count'], 2)
+
+        AutonomousSystem.objects.get(asn=64502).delete()
+        response = self.client.get('/')
+        self.assertEqual(response.context['statistics']['as_count'], 1)
+
+    def test_other_models_deleted_in_bulk(self):
+        # Receivers of uncounted models would prevent bulk deletes
+        collector = Collector(using='default')
+        for model in [Prefix, NetworkIXLAN, Organization]:
+            self.assertTrue(collector.can_fast_delete(model.objects.all()))
+
+
+class InternetExchangeTestCase(TestCase):
+    @override_settings(MY_ASN=64500)
+    def test_get_available_peers(self):
+        internet_exchange = InternetExchange.objects.create(
+            name='Test IX', slug='test-ix', peeringdb_id=1)
+        autonomous_system = AutonomousSystem.objects.create(
+            asn=64501, name='Peer')
+        PeeringSession.objects.create(autonomous_system=autonomous_system,
+                                      internet_exchange=internet_exchange,
+                                      ip_address='2001:db8::1')
+
+        # Our own network and two peers, one of them already configured
+        PeeringDBInternetExchange.objects.create(id=1, org_id=1, name='Test IX')
+        for namespace in ['ix', 'net', 'netixlan']:
+            SynchronizationCheckpoint.objects.create(
+                namespace=namespace, since=0, synchronized=timezone.now())
+        NetworkIXLAN.objects.create(id=1, asn=64500, name='Test IX',
+                                    ipaddr6='2001:db8::', ix_id=1, ixlan_id=1)
+        for asn in [64501, 64502]:
+            Network.objects.create(id=asn, asn=asn, name='AS{}'.format(asn))
+            NetworkIXLAN.objects.create(id=asn, asn=asn, name='Test IX',
+                                        ipaddr6='2001:db8::{}'.format(asn - 64500),
+                                        ipaddr4='192.0.2.{}'.format(asn - 64500),
+                                        ix_id=1, ixlan_id=1)
+
+        peers = {peer['network'].asn: peer
+                 for peer in internet_exchange.get_available_peers()}
+
+        self.assertEqual(sorted(peers), [64501, 64502])
+        self.assertTrue(peers[64501]['peering6'])
+        self.assertFalse(peers[64501]['peering4'])
+        self.assertFalse(peers[64502]['peering6'])
+        self.assertFalse(peers[64502]['peering4'])
+
+    def test_peeringdb_import(self):
+        cache.clear()
+        User.objects.create_user('user', password='password')
+        self.client.login(username='user', password='password')
+
+        # An ASN unknown to PeeringDB has no IX networks to import
+        with patch.object(PeeringDB, 'lookup', return_value={'data': []}):
+            response = self.client.get('/ix/peeringdb_import/', follow=True)
+        self.assertEqual([str(message) for message in response.context['messages']],
+                         ['No data to import.'])
+
+        cache.clear()
+        with patch.object(PeeringDB, 'lookup', return_value=None):
+            response = self.client.get('/ix/peeringdb_import/', follow=True)
+        self.assertIn('Cannot retrieve the IX networks from PeeringDB.',
+                      [str(message) for message in response.context['messages']])
+
+    @patch.object(InternetExchange, 'get_available_peers', side_effect=[None, []])
+    def test_available_peers_cache(self, get_available_peers):
+        cache.clear()
+        internet_exchange = InternetExchange.objects.create(
+            name='Test IX', slug='test-ix', peeringdb_id=1)
+        User.objects.create_user('user', password='password')
+        self.client.login(username='user', password='password')
+
+        # Failures are not cached, no peers found are
+        for _ in range(3):
+            response = self.client.get('/ix/test-ix/peers/')
+            self.assertEqual(response.context['internet_exchange'],
+                             internet_exchange)
+        self.assertEqual(get_available_peers.call_count, 2)
+
+
+class PeeringSessionTestCase(TestCase):
+    def test_ip_version(self):
+        internet_exchange = InternetExchange.objects.create(
+            name='Test IX', slug='test-ix')
+        autonomous_system = AutonomousSystem.objects.create(
+            asn=64501, name='Peer')
+        for ip_address in ['2001:db8::1', '192.0.2.1', '192.0.2.2']:
+            PeeringSession.objects.create(autonomous_system=autonomous_system,
+                                          internet_exchange=internet_exchange,
+                                          ip_address=ip_address)
+
+        self.assertEqual(PeeringSession.objects.filter(
+            ip_version=PeeringSession.IP_VERSION_6).count(), 1)
+        self.assertEqual(PeeringSession.objects.filter(
+            ip_version=PeeringSession.IP_VERSION_4).count(), 2)
+
+        # Changing the address updates the version
+        session = PeeringSession.objects.get(ip_address='192.0.2.2')
+        session.ip_address = '2001:db8::2'
+        session.save()
+        self.assertEqual(PeeringSession.objects.get(pk=session.pk).ip_version,
+                         PeeringSession.IP_VERSION_6)
+
+    def test_unique_ip_address(self):
+        internet_exchanges = [
+            InternetExchange.objects.create(name='IX {}'.format(i),
+                                            slug='ix-{}'.format(i))
+            for i in range(2)]
+        autonomous_system = AutonomousSystem.objects.create(
+            asn=64501, name='Peer')
+        session = PeeringSession.objects.create(
+            autonomous_system=autonomous_system,
+            internet_exchange=internet_exchanges[0], ip_address='2001:db8::1')
+
+        self.assertTrue(PeeringSession.does_exist('2001:db8::1'))
+        self.assertFalse(PeeringSession.does_exist('2001:db8::2'))
+
+        # Same address on another IX
+        PeeringSession.objects.create(
+            autonomous_system=autonomous_system,
+            internet_exchange=internet_exchanges[1], ip_address='2001:db8::1')
+
+        with self.assertRaises(ValidationError):
+            PeeringSession(autonomous_system=autonomous_system,
+                           internet_exchange=internet_exchanges[0],
+                           ip_address='2001:db8::1').full_clean()
+        self.assertEqual(PeeringSession.objects.get_or_create(
+            internet_exchange=internet_exchanges[0], ip_address='2001:db8::1',
+            defaults={'autonomous_system': autonomous_system}), (session, False))
+
+    def test_ip_address_validation(self):
+        internet_exchange = InternetExchange.objects.create(
+            name='Test IX', slug='test-ix', peeringdb_id=1)
+        autonomous_system = AutonomousSystem.objects.create(
+            asn=64501, name='Peer')
+        session = PeeringSession(autonomous_system=autonomous_system,
+                                 internet_exchange=internet_exchange,
+                                 ip_address='2001:db8:1::1')
+
+        # Nothing to check against
+        session.full_clean()
+
+        NetworkIXLAN.objects.create(id=1, asn=64500, name='Test IX',
+                                    ix_id=1, ixlan_id=1)
+        Prefix.objects.create(protocol='IPv6', prefix='2001:db8::/48',
+                              ixlan_id=1)
+        prefix_index.refresh(force=True)
+        self.addCleanup(prefix_index.clear)
+
+        with self.assertRaises(ValidationError):
+            session.full_clean()
+
+        session.ip_address = '2001:db8::1'
+        session.full_clean()
+
+
+class PrefixesCacheTestCase(TestCase):
+    PREFIXES = [{'protocol': 'IPv6', 'prefix': '2001:db8::/64'}]
+
+    def setUp(self):
+        cache.clear()
+        self.internet_exchange = InternetExchange.objects.create(
+            name='Test IX', slug='test-ix', peeringdb_id=1)
+
+    @patch.object(PeeringDB, 'get_prefixes_for_ix_network', return_value=PREFIXES)
+    def test_blocking(self, get_prefixes_for_ix_network):
+        self.assertEqual(self.internet_exchange.get_prefixes(block=True),
+                         self.PREFIXES)
+        self.assertEqual(InternetExchange.objects.get(
+            pk=self.internet_exchange.pk).get_prefixes(), self.PREFIXES)
+        get_prefixes_for_ix_network.assert_called_once_with(1)
+
+        # A new synchronization makes the entry obsolete
+        Synchronization.objects.create(time=timezone.now(), added=1,
+                                       updated=0, deleted=0)
+        InternetExchange.objects.get(
+            pk=self.internet_exchange.pk).get_prefixes(block=True)
+        self.assertEqual(get_prefixes_for_ix_network.call_count, 2)
+
+    @patch.object(PeeringDB, 'get_prefixes_for_ix_network', return_value=[])
+    def test_no_prefixes(self, get_prefixes_for_ix_network):
+        with patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.assertEqual(self.internet_exchange.get_prefixes(block=True), [])
+        self.assertEqual(cache_set.call_args[0][2],
+                         settings.PEERINGDB_MISSING_TIMEOUT)
+
+        # Known to have no prefixes, not being retrieved
+        internet_exchange = InternetExchange.objects.get(pk=self.internet_exchange.pk)
+        with patch.object(prefixes_cache, 'get', wraps=prefixes_cache.get) as get:
+            self.assertEqual(internet_exchange.get_prefixes(), [])
+            self.assertEqual(internet_exchange.get_prefixes(), [])
+            self.assertFalse(internet_exchange.is_retrieving_prefixes())
+        get.assert_called_once_with(1, block=False)
+        get_prefixes_for_ix_network.assert_called_once_with(1)
+
+        response = self.client.get(self.internet_exchange.get_absolute_url())
+        self.assertContains(response, 'No prefixes found in PeeringDB.')
+
+    def test_background(self):
+        released = threading.Event()
+
+        def fetch(ix_network_id):
+            released.wait()
+            return self.PREFIXES
+
+        with patch.object(PeeringDB, 'get_prefixes_for_ix_network',
+                          side_effect=fetch) as get_prefixes_for_ix_network:
+            self.assertEqual(self.internet_exchange.get_prefixes(), [])
+            self.assertTrue(self.internet_exchange.is_retrieving_prefixes())
+            released.set()
+
+            # Wait for the background thread
+            for _ in range(100):
+                if not prefixes_cache.pending:
+                    break
+                time.sleep(0.05)
+
+        self.assertEqual(self.internet_exchange.get_prefixes(), self.PREFIXES)
+        self.assertFalse(self.internet_exchange.is_retrieving_prefixes())
+        get_prefixes_for_ix_network.assert_called_once_with(1)
+
+
+class ReconciliationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_prefix_classifier(self):
+        classifier = PrefixClassifier(['2001:db8::/64', '192.0.2.0/25',
+                                       '192.0.2.128/25', '198.51.100.0/24',
+                                       '198.51.100.0/26'])
+
+        for ip_address in ['2001:db8::1', '192.0.2.0', '192.0.2.255',
+                           '198.51.100.200']:
+            self.assertIn(ipaddress.ip_address(ip_address), classifier)
+        for ip_address in ['2001:db8:1::1', '192.0.1.255', '198.51.101.0',
+                           '203.0.113.1', '::ffff:c000:201']:
+            self.assertNotIn(ipaddress.ip_address(ip_address), classifier)
+
+    @patch.object(PeeringDB, 'lookup', return_value={'data': []})
+    def test_import_peering_sessions(self, lookup):
+        internet_exchange = InternetExchange.objects.create(
+            name='Test IX', slug='test-ix')
+        PeeringSession.objects.create(
+            autonomous_system=AutonomousSystem.objects.create(
+                asn=64501, name='Known'),
+            internet_exchange=internet_exchange, ip_address='2001:db8::1')
+        Network.objects.create(id=1, asn=64502, name='Cached',
+                               info_prefixes6=10, info_prefixes4=20)
+
+        bgp_sessions = [
+            {'ip_address': ipaddress.ip_address(ip_address), 'remote_asn': asn}
+            for ip_address, asn in [
+                ('2001:db8::1', 64501), ('192.0.2.1', 64501),
+                ('2001:db8::2', 64502), ('192.0.2.2', 64502),
+                ('2001:db8::2', 64502), ('2001:db8::3', 64503),
+                ('203.0.113.1', 64504)]]
+
+        classifier = PrefixClassifier(['2001:db8::/64', '192.0.2.0/24'])
+        report = import_peering_sessions(internet_exchange, bgp_sessions,
+                                         classifier)
+
+        self.assertEqual([a.asn for a in report.autonomous_systems], [64502])
+        self.assertEqual([s.ip_address for s in report.peering_sessions],
+                         ['192.0.2.1', '2001:db8::2', '192.0.2.2'])
+        self.assertEqual(report.existing, ['2001:db8::1'])
+        self.assertEqual(report.outside_prefixes, ['203.0.113.1'])
+        self.assertEqual(report.unknown_asns, {64503: ['2001:db8::3']})
+
+        # Unknown ASNs are looked up only once, with their IX networks
+        self.assertEqual(lookup.call_count, 2)
+
+        autonomous_system = AutonomousSystem.objects.get(asn=64502)
+        self.assertEqual(autonomous_system.ipv6_max_prefixes, 10)
+        self.assertEqual(sorted(autonomous_system.peeringsession_set.values_list(
+            'ip_address', 'ip_version')), [('192.0.2.2', 4), ('2001:db8::2', 6)])
+
+        # Running it again does not create anything
+        report = import_peering_sessions(internet_exchange, bgp_sessions,
+                                         classifier)
+        self.assertFalse(report.autonomous_systems)
+        self.assertFalse(report.peering_sessions)
+        self.assertEqual(len(report.existing), 4)
+
+        # The same addresses can be used on another IX
+        other_internet_exchange = InternetExchange.objects.create(
+            name='Other IX', slug='other-ix')
+        report = import_peering_sessions(other_internet_exchange,
+                                         bgp_sessions, classifier)
+        self.assertEqual(len(report.peering_sessions), 4)
+        self.assertFalse(report.existing)
+
+
+class ConfigurationCacheTestCase(TestCase):
+    TEMPLATE = """{%- for group in peering_groups %}
+{%- for session in group.sessions %}
+{{ group.name }} {{ session.ip_address }} AS{{ session.peer_as }} {{ session.max_prefixes }}
+{%- endfor %}
+{%- endfor %}
+{%- for community in communities %}
+{{ community.value }}
+{%- endfor %}"""
+
+    def setUp(self):
+        cache.clear()
+        self.template = ConfigurationTemplate.objects.create(
+            name='Test', template=self.TEMPLATE)
+        self.internet_exchange = InternetExchange.objects.create(
+            name='Test IX', slug='test-ix', configuration_template=self.template)
+        self.autonomous_system = AutonomousSystem.objects.create(
+            asn=64501, name='Peer', ipv6_max_prefixes=10, ipv4_max_prefixes=20)
+        for ip_address in ['2001:db8::1', '192.0.2.1']:
+            PeeringSession.objects.create(
+                autonomous_system=self.autonomous_system,
+                internet_exchange=self.internet_exchange, ip_address=ip_address)
+
+    def get_config(self):
+        # Always use a fresh instance, like views do
+        return InternetExchange.objects.get(pk=self.internet_exchange.pk).get_config()
+
+    def test_hit(self):
+        statistics = configuration_cache.get_statistics()
+        config = self.get_config()
+        self.assertEqual(config, '\nipv6 2001:db8::1 AS64501 10\nipv4 192.0.2.1 AS64501 20')
+
+        # Only the IX, its template and the fingerprint are queried
+        with self.assertNumQueries(4):
+            self.assertEqual(self.get_config(), config)
+
+        new_statistics = configuration_cache.get_statistics()
+        self.assertEqual(new_statistics['misses'], statistics['misses'] + 1)
+        self.assertEqual(new_statistics['hits'], statistics['hits'] + 1)
+
+    def test_invalidation(self):
+        self.get_config()
+
+        self.autonomous_system.ipv4_max_prefixes = 30
+        self.autonomous_system.save()
+        self.assertIn('AS64501 30', self.get_config())
+
+        community = Community.objects.create(name='Community', value='64500:1')
+        self.internet_exchange.communities.add(community)
+        self.assertIn('64500:1', self.get_config())
+
+        community.value = '64500:2'
+        community.save()
+        self.assertIn('64500:2', self.get_config())
+
+        self.template.template = 'updated'
+        self.template.save()
+        self.assertEqual(self.get_config(), 'updated')
+
+    def test_fingerprint(self):
+        self.get_config()
+
+        # Changes made without signals are noticed too
+        AutonomousSystem.objects.update(ipv6_max_prefixes=40)
+        self.assertIn('AS64501 40', self.get_config())
+
+
+class TemplateCompilationTestCase(TestCase):
+    def setUp(self):
+        self.template = ConfigurationTemplate.objects.create(
+            name='Test', template='{{ internet_exchange.name }}')
+
+    def test_compiled_once(self):
+        compiled = get_template(self.template)
+        with self.assertNumQueries(0):
+            self.assertIs(get_template(self.template), compiled)
+
+        # A new version of the template is compiled again
+        self.template.template = '{{ internet_exchange.slug }}'
+        self.template.save()
+        recompiled = get_template(self.template)
+        self.assertIsNot(recompiled, compiled)
+        self.assertEqual(recompiled.render(
+            internet_exchange={'slug': 'test-ix'}), 'test-ix')
+
+    def test_bytecode_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(setattr, templating, '_environment', None)
+
+        with override_settings(JINJA2_BYTECODE_CACHE_DIR=directory):
+            templating._environment = None
+            get_template(self.template)
+
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            # A new process loads the bytecode instead of compiling
+            templating._environment = None
+            with patch('jinja2.Environment.compile') as compile:
+                get_template(self.template)
+            compile.assert_not_called()
+
+
+class ConfigurationGenerationTestCase(TestCase):
+    def setUp(self):
+        template = ConfigurationTemplate.objects.create(
+            name='Test', template=ConfigurationCacheTestCase.TEMPLATE)
+        community = Community.objects.create(name='Community', value='64500:1')
+        for i in range(1, 4):
+            internet_exchange = InternetExchange.objects.create(
+                name='IX {}'.format(i), slug='ix-{}'.format(i),
+                configuration_template=template)
+            internet_exchange.communities.add(community)
+            for j in range(1, 4):
+                autonomous_system, _ = AutonomousSystem.objects.get_or_create(
+                    asn=64500 + j, name='AS {}'.format(j))
+                PeeringSession.objects.create(
+                    autonomous_system=autonomous_system,
+                    internet_exchange=internet_exchange,
+                    ip_address='2001:db8:{}::{}'.format(i, j))
+        # An IX without template is ignored
+        InternetExchange.objects.create(name='IX 4', slug='ix-4')
+
+    def test_generate_configurations(self):
+        get_template(ConfigurationTemplate.objects.get())
+
+        # IXs, communities and sessions are each fetched with one query
+        with self.assertNumQueries(3):
+            configurations = generate_configurations()
+
+        self.assertEqual([ix.slug for ix in configurations],
+                         ['ix-1', 'ix-2', 'ix-3'])
+        for internet_exchange, configuration in configurations.items():
+            self.assertEqual(configuration, internet_exchange.render_config())
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        call_command('generate_configs', directory, processes=2,
+                     slugs=['ix-1', 'ix-2'], stdout=StringIO())
+
+        self.assertEqual(sorted(os.listdir(directory)),
+                         ['ix-1.conf', 'ix-2.conf'])
+        with open(os.path.join(directory, 'ix-2.conf')) as config:
+            self.assertEqual(config.read(), InternetExchange.objects.get(
+                slug='ix-2').render_config())
+
+
+class FakeNAPALMDevice(object):
+    """
+    NAPALM device answering after some latency, or failing if an error is
+    given.
+    """
+
+    def __init__(self, latency=0, neighbors=None, error=None):
+        self.latency = latency
+        self.neighbors = neighbors or {}
+        self.error = error
+        self.alive = False
+        self.opened = 0
+
+    def open(self):
+        time.sleep(self.latency)
+        if self.error:
+            raise self.error
+        self.alive = True
+        self.opened += 1
+
+    def close(self):
+        self.alive = False
+
+    def is_alive(self):
+        return {'is_alive': self.alive}
+
+    def get_bgp_neighbors(self):
+        return {'global': {'router_id': '192.0.2.254', 'peers': self.neighbors}}
+
+
+class NAPALMConnectionPoolTestCase(TestCase):
+    def setUp(self):
+        self.router = Router.objects.create(name='router', hostname='router',
+                                            platform=Router.PLATFORM_JUNOS)
+        self.device = FakeNAPALMDevice()
+        patcher = patch.object(Router, 'get_napalm_device',
+                               return_value=self.device)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use(self, pool, router=None):
+        with pool.connection(router or self.router) as device:
+            return device
+
+    def test_reuse(self):
+        pool = NAPALMConnectionPool(idle_timeout=60, max_lifetime=60)
+        for _ in range(3):
+            self.assertIs(self.use(pool), self.device)
+
+        self.assertEqual(self.device.opened, 1)
+        self.assertTrue(self.device.alive)
+
+        pool.close_all()
+        self.assertFalse(self.device.alive)
+
+    def test_health_check(self):
+        pool = NAPALMConnectionPool(idle_timeout=60, max_lifetime=60)
+        self.use(pool)
+
+        # The session died in the background
+        self.device.alive = False
+        self.use(pool)
+        self.assertEqual(self.device.opened, 2)
+
+    def test_error(self):
+        pool = NAPALMConnectionPool(idle_timeout=60, max_lifetime=60)
+        with self.assertRaises(IOError):
+            with pool.connection(self.router):
+                raise IOError('Broken pipe')
+
+        self.assertFalse(self.device.alive)
+        self.use(pool)
+        self.assertEqual(self.device.opened, 2)
+
+    def test_expiration(self):
+        # Closed right after being used
+        pool = NAPALMConnectionPool(idle_timeout=60, max_lifetime=0)
+        self.use(pool)
+        self.assertFalse(self.device.alive)
+
+        # Closed when another router is used after the idle timeout
+        pool = NAPALMConnectionPool(idle_timeout=0.1, max_lifetime=60)
+        self.use(pool)
+        time.sleep(0.1)
+        other_router = Router.objects.create(name='other', hostname='other',
+                                             platform=Router.PLATFORM_JUNOS)
+        with patch.object(Router, 'get_napalm_device',
+                          return_value=FakeNAPALMDevice()):
+            self.use(pool, router=other_router)
+        self.assertFalse(self.device.alive)
+
+    def test_reaper(self):
+        # Closed after the idle timeout without using the pool again
+        pool = NAPALMConnectionPool(idle_timeout=0.1, max_lifetime=60)
+        self.use(pool)
+        self.assertTrue(self.device.alive)
+
+        for _ in range(50):
+            if pool.reaper is None:
+                break
+            time.sleep(0.05)
+        self.assertFalse(self.device.alive)
+        self.assertIsNone(pool.reaper)
+
+    def test_timeout_change(self):
+        pool = NAPALMConnectionPool(idle_timeout=60, max_lifetime=60)
+        with pool.connection(self.router, timeout=5):
+            pass
+        with pool.connection(self.router, timeout=5):
+            pass
+        self.assertEqual(self.device.opened, 1)
+
+        with pool.connection(self.router, timeout=10):
+            pass
+        self.assertEqual(self.device.opened, 2)
+        pool.close_all()
+
+    def test_router_change(self):
+        pool = NAPALMConnectionPool(idle_timeout=60, max_lifetime=60)
+        self.use(pool)
+
+        self.router.hostname = 'router.example.net'
+        self.use(pool)
+        self.assertEqual(self.device.opened, 2)
+
+
+class BGPSessionsCollectorTestCase(TestCase):
+    def setUp(self):
+        self.addCleanup(pool.close_all)
+
+    def collect(self, devices, **kwargs):
+        routers = []
+        for hostname in devices:
+            routers.append(Router.objects.create(
+                name=hostname, hostname=hostname, platform=Router.PLATFORM_JUNOS))
+
+        def get_napalm_device(router, timeout=None):
+            return devices[router.hostname]
+
+        with patch.object(Router, 'get_napalm_device', get_napalm_device):
+            return collect_bgp_sessions(routers, **kwargs)
+
+    def test_parallel_collection(self):
+        devices = {}
+        for i in range(8):
+            devices['router{}'.format(i)] = FakeNAPALMDevice(
+                latency=0.2, neighbors={'192.0.2.{}'.format(i): {'remote_as': 64500 + i}})
+
+        start = time.time()
+        collection = self.collect(devices, max_workers=8, timeout=5)
+
+        # Serial collection would take 1.6 seconds
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(len(collection.sessions), 8)
+        self.assertFalse(collection.failures)
+        for router, sessions in collection.sessions.items():
+            i = int(router.hostname[-1])
+            self.assertEqual(sessions, [{
+                'ip_address': ipaddress.ip_address('192.0.2.{}'.format(i)),
+                'remote_asn': 64500 + i,
+            }])
+
+    def test_partial_failures(self):
+        devices = {
+            'working': FakeNAPALMDevice(neighbors={'2001:db8::1': {'remote_as': 64501}}),
+            'failing': FakeNAPALMDevice(error=IOError('Connection refused')),
+            'hanging': FakeNAPALMDevice(latency=1.5),
+        }
+        collection = self.collect(devices, max_workers=3, timeout=0.5)
+
+        self.assertEqual([router.hostname for router in collection.sessions],
+                         ['working'])
+        failures = {router.hostname: error
+                    for router, error in collection.failures.items()}
+        self.assertEqual(failures['failing'], 'Connection refused')
+        self.assertIn('Timed out', failures['hanging'])
@@ -19,7 +19,8 @@ from .filters import (AutonomousSystemFilter, CommunityFilter, ConfigurationTemp
 from .forms import (AutonomousSystemForm, AutonomousSystemCSVForm, AutonomousSystemFilterForm, CommunityForm, CommunityCSVForm, CommunityFilterForm, ConfigurationTemplateForm, ConfigurationTemplateFilterForm, InternetExchangeForm,
                     InternetExchangePeeringDBForm, InternetExchangeCommunityForm, InternetExchangeCSVForm, InternetExchangeFilterForm, PeeringSessionForm, PeeringSessionFilterForm, PeeringSessionFilterFormForAS, RouterForm, RouterCSVForm, RouterFilterForm)
 from .models import (AutonomousSystem, Community,
-                     ConfigurationTemplate, InternetExchange, PeeringSession, Router)
+                     ConfigurationTemplate, InternetExchange, PeeringSession, Router,
+                     available_peers_cache)
 from .tables import (AutonomousSystemTable, CommunityTable, ConfigurationTemplateTable,
                      InternetExchangeTable, PeerTable, PeeringSessionTable, PeeringSessionTableForAS, RouterTable)
 from peeringdb.api import PeeringDB
@@ -32,7 +33,7 @@ from utils.views import (AddOrEditView, ConfirmationView,
 
 
 class ASList(ModelListView):
-    queryset = AutonomousSystem.objects.order_by('asn')
+    queryset = AutonomousSystem.objects.annotate_counts().order_by('asn')
     filter = AutonomousSystemFilter
     filter_form = AutonomousSystemFilterForm
     table = AutonomousSystemTable
@@ -53,7 +54,8 @@ class ASImport(ImportView):
 
 class ASDetails(View):
     def get(self, request, asn):
-        autonomous_system = get_object_or_404(AutonomousSystem, asn=asn)
+        autonomous_system = get_object_or_404(
+            AutonomousSystem.objects.annotate_counts(), asn=asn)
         context = {
             'autonomous_system': autonomous_system,
         }
@@ -112,7 +114,7 @@ class ASPeeringSessions(ModelListView):
         # for it
         if 'asn' in kwargs:
             autonomous_system = get_object_or_404(
-                AutonomousSystem, asn=kwargs['asn'])
+                AutonomousSystem.objects.annotate_counts(), asn=kwargs['asn'])
             extra_context.update({'autonomous_system': autonomous_system})
 
         return extra_context
@@ -196,7 +198,7 @@ class ConfigTemplateDelete(DeleteView):
 
 
 class IXList(ModelListView):
-    queryset = InternetExchange.objects.order_by('name')
+    queryset = InternetExchange.objects.annotate_counts().order_by('name')
     table = InternetExchangeTable
     filter = InternetExchangeFilter
     filter_form = InternetExchangeFilterForm
@@ -237,24 +239,30 @@ class IXImportFromRouter(ConfirmationView):
             messages.error(
                 request, 'Cannot import peering sessions from the router.')
         else:
-            if result[0] == 0 and result[1] == 0:
+            if not result.autonomous_systems and not result.peering_sessions:
                 messages.warning(
                     request, 'No peering sessions have been imported.')
             else:
-                if result[0] > 0:
+                if result.autonomous_systems:
                     message = 'Imported {} {}'.format(
-                        result[0], AutonomousSystem._meta.verbose_name_plural)
-                    messages.success(message)
+                        result.autonomous_systems_count,
+                        AutonomousSystem._meta.verbose_name_plural)
+                    messages.success(request, message)
                     UserAction.objects.log_import(
                         request.user, AutonomousSystem, message)
 
-                if result[1] > 0:
+                if result.peering_sessions:
                     message = 'Imported {} {}'.format(
-                        result[0], PeeringSession._meta.verbose_name_plural)
-                    messages.success(message)
+                        result.peering_sessions_count,
+                        PeeringSession._meta.verbose_name_plural)
+                    messages.success(request, message)
                     UserAction.objects.log_import(
                         request.user, PeeringSession, message)
 
+            if result.unknown_asns:
+                messages.warning(request, 'Ignored peering sessions with ASes not found in PeeringDB: {}'.format(
+                    ', '.join('AS{}'.format(asn) for asn in result.unknown_asns)))
+
         return redirect(self.return_url)
 
 
@@ -272,6 +280,11 @@ class IXPeeringDBImport(TableImportView):
                 known_objects.append(ix.peeringdb_id)
 
         ix_networks = api.get_ix_networks_for_asn(settings.MY_ASN)
+        if ix_networks is None:
+            messages.error(self.request,
+                           'Cannot retrieve the IX networks from PeeringDB.')
+            return objects
+
         for ix_network in ix_networks:
             if ix_network.id not in known_objects:
                 objects.append({
@@ -379,7 +392,16 @@ class IXPeeringSessions(ModelListView):
 class IXPeers(LoginRequiredMixin, View):
     def get(self, request, slug):
         internet_exchange = get_object_or_404(InternetExchange, slug=slug)
-        available_peers = PeerTable(internet_exchange.get_available_peers())
+
+        # Peers change with the peering sessions of the IX, which invalidate
+        # the cache, or with a new PeeringDB synchronization, failures to get
+        # them are not cached and no peers found are looked for again sooner
+        peers = available_peers_cache.get_or_compute(
+            '{}.{}'.format(internet_exchange.pk, PeeringDB().get_last_sync_time()),
+            internet_exchange.get_available_peers,
+            store=lambda peers: peers is not None,
+            timeout=lambda peers: None if peers else settings.PEERINGDB_MISSING_TIMEOUT)
+        available_peers = PeerTable(peers or [])
         paginate = {
             'klass': EnhancedPaginator,
             'per_page': settings.PAGINATE_COUNT
@@ -402,11 +424,8 @@ class IXAddPeer(LoginRequiredMixin, View):
         network_ixlan = get_object_or_404(NetworkIXLAN, id=network_ixlan_id)
 
         # Check if the AS we are going to peer with is already known
-        known_autonomous_system = True
-        try:
-            AutonomousSystem.objects.get(asn=network.asn)
-        except AutonomousSystem.DoesNotExist:
-            known_autonomous_system = False
+        known_autonomous_system = AutonomousSystem.objects.filter(
+            asn=network.asn).exists()
 
         # Init a form that the user must submit to confirm the peering
         form = ConfirmationForm(initial=request.GET)
@@ -434,55 +453,30 @@ class IXAddPeer(LoginRequiredMixin, View):
 
             with transaction.atomic():
                 # Create the new AS if needed
-                try:
-                    autonomous_system = AutonomousSystem.objects.get(
-                        asn=network.asn)
-                except AutonomousSystem.DoesNotExist:
-                    values = {
-                        'asn': network.asn,
-                        'name': network.name,
-                        'irr_as_set': network.irr_as_set,
-                        'ipv6_max_prefixes': network.info_prefixes6,
-                        'ipv4_max_prefixes': network.info_prefixes4,
-                    }
-                    autonomous_system = AutonomousSystem(**values)
-                    autonomous_system.save()
+                values = {
+                    'name': network.name,
+                    'irr_as_set': network.irr_as_set,
+                    'ipv6_max_prefixes': network.info_prefixes6,
+                    'ipv4_max_prefixes': network.info_prefixes4,
+                }
+                autonomous_system, created = AutonomousSystem.objects.get_or_create(
+                    asn=network.asn, defaults=values)
+                if created:
                     peer_added = True
                     # Log the action
                     UserAction.objects.log_create(request.user, autonomous_system, 'Created {} {}'.format(
                         AutonomousSystem._meta.verbose_name, escape(autonomous_system)))
 
-                # Record the IPv6 session if we can
-                if network_ixlan.ipaddr6:
-                    try:
-                        PeeringSession.objects.get(
-                            autonomous_system=autonomous_system, internet_exchange=internet_exchange, ip_address=network_ixlan.ipaddr6)
-                    except PeeringSession.DoesNotExist:
-                        values = {
-                            'autonomous_system': autonomous_system,
-                            'internet_exchange': internet_exchange,
-                            'ip_address': network_ixlan.ipaddr6,
-                        }
-                        session = PeeringSession(**values)
-                        session.save()
-                        peer_added = True
-                        # Log the action
-                        UserAction.objects.log_create(request.user, session, 'Created {} {}'.format(
-                            PeeringSession._meta.verbose_name, escape(session)))
+                # Record the IPv6 and IPv4 sessions if we can, an address is
+                # unique within an IX
+                for ip_address in [network_ixlan.ipaddr6, network_ixlan.ipaddr4]:
+                    if not ip_address:
+                        continue
 
-                # Record the IPv4 session if we can
-                if network_ixlan.ipaddr4:
-                    try:
-                        PeeringSession.objects.get(
-                            autonomous_system=autonomous_system, internet_exchange=internet_exchange, ip_address=network_ixlan.ipaddr4)
-                    except PeeringSession.DoesNotExist:
-                        values = {
-                            'autonomous_system': autonomous_system,
-                            'internet_exchange': internet_exchange,
-                            'ip_address': network_ixlan.ipaddr4,
-                        }
-                        session = PeeringSession(**values)
-                        session.save()
+                    session, created = PeeringSession.objects.get_or_create(
+                        internet_exchange=internet_exchange, ip_address=ip_address,
+                        defaults={'autonomous_system': autonomous_system})
+                    if created:
                         peer_added = True
                         # Log the action
                         UserAction.objects.log_create(request.user, session, 'Created {} {}'.format(
@@ -16,3 +16,13 @@ TIME_ZONE = 'Europe/Paris'
 
 # Autonomous System number
 MY_ASN = 64512
+
+# PeeringDB API key, optional, used to get a higher request rate limit
+# PEERINGDB_API_KEY = ''
+
+# Cache backend shared by the worker processes: locmem (default, one cache per
+# process), file, memcached (needs python-memcached) or redis (needs
+# django-redis). CACHE_LOCATION is the directory, the memcached address or the
+# Redis URL to use.
+# CACHE_BACKEND = 'redis'
+# CACHE_LOCATION = 'redis://127.0.0.1:6379/1'
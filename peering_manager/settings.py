@@ -34,7 +34,25 @@ NAPALM_USERNAME = getattr(configuration, 'NAPALM_USERNAME', '')
 NAPALM_PASSWORD = getattr(configuration, 'NAPALM_PASSWORD', '')
 NAPALM_TIMEOUT = getattr(configuration, 'NAPALM_TIMEOUT', 30)
 NAPALM_ARGS = getattr(configuration, 'NAPALM_ARGS', {})
+NAPALM_WORKERS = getattr(configuration, 'NAPALM_WORKERS', 8)
+NAPALM_POOL_IDLE_TIMEOUT = getattr(configuration, 'NAPALM_POOL_IDLE_TIMEOUT', 300)
+NAPALM_POOL_MAX_LIFETIME = getattr(configuration, 'NAPALM_POOL_MAX_LIFETIME', 3600)
 PAGINATE_COUNT = getattr(configuration, 'PAGINATE_COUNT', 20)
+CONFIGURATION_CACHE_TIMEOUT = getattr(configuration, 'CONFIGURATION_CACHE_TIMEOUT', 86400)
+JINJA2_CACHE_SIZE = getattr(configuration, 'JINJA2_CACHE_SIZE', 100)
+JINJA2_BYTECODE_CACHE_DIR = getattr(configuration, 'JINJA2_BYTECODE_CACHE_DIR', None)
+PREFIXES_CACHE_TIMEOUT = getattr(configuration, 'PREFIXES_CACHE_TIMEOUT', 3600)
+PEERINGDB_API_KEY = getattr(configuration, 'PEERINGDB_API_KEY', None)
+PEERINGDB_TIMEOUT = getattr(configuration, 'PEERINGDB_TIMEOUT', 30)
+PEERINGDB_RETRIES = getattr(configuration, 'PEERINGDB_RETRIES', 3)
+PEERINGDB_BACKOFF = getattr(configuration, 'PEERINGDB_BACKOFF', 1)
+PEERINGDB_MAX_RETRY_DELAY = getattr(configuration, 'PEERINGDB_MAX_RETRY_DELAY', 10)
+PEERINGDB_FETCHED_TIMEOUT = getattr(configuration, 'PEERINGDB_FETCHED_TIMEOUT', 86400)
+PEERINGDB_MISSING_TIMEOUT = getattr(configuration, 'PEERINGDB_MISSING_TIMEOUT', 300)
+LOOKUP_CACHE_TIMEOUT = getattr(configuration, 'LOOKUP_CACHE_TIMEOUT', 300)
+CACHE_BACKEND = getattr(configuration, 'CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = getattr(configuration, 'CACHE_LOCATION', '')
+CACHE_TIMEOUT = getattr(configuration, 'CACHE_TIMEOUT', 300)
 TIME_ZONE = getattr(configuration, 'TIME_ZONE', 'UTC')
 MY_ASN = getattr(configuration, 'MY_ASN', -1)
 
@@ -73,6 +91,39 @@ if LDAP_CONFIGURED:
         )
 
 
+# Cache backend, the Redis and memcached ones need additional packages
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', None),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', None),
+    'memcached': ('django.core.cache.backends.memcached.MemcachedCache',
+                  'memcache'),
+    'redis': ('django_redis.cache.RedisCache', 'django_redis'),
+}
+
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        'The CACHE_BACKEND setting must be one of: {}.'.format(', '.join(sorted(CACHE_BACKENDS))))
+
+CACHE_BACKEND_CLASS, CACHE_BACKEND_PACKAGE = CACHE_BACKENDS[CACHE_BACKEND]
+if CACHE_BACKEND_PACKAGE:
+    try:
+        __import__(CACHE_BACKEND_PACKAGE)
+    except ImportError:
+        raise ImproperlyConfigured(
+            'The {} cache backend has been configured, but {} is not installed.'.format(
+                CACHE_BACKEND, CACHE_BACKEND_PACKAGE)
+        )
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND_CLASS,
+        'LOCATION': CACHE_LOCATION,
+        'TIMEOUT': CACHE_TIMEOUT,
+        'KEY_PREFIX': 'peering-manager',
+    }
+}
+
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -178,7 +229,15 @@ LOGGING = {
         'peering.manager.peeringdb': {
             'handlers': ['file'],
             'level': 'DEBUG',
-        }
+        },
+        'peering.manager.napalm': {
+            'handlers': ['file'],
+            'level': 'DEBUG',
+        },
+        'peering.manager.templating': {
+            'handlers': ['file'],
+            'level': 'DEBUG',
+        },
     }
 }
 
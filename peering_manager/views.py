@@ -14,7 +14,8 @@ from django.views.generic import View
 
 from .forms import LoginForm, UserPasswordChangeForm
 from peering.models import (AutonomousSystem, Community,
-                            ConfigurationTemplate, InternetExchange, PeeringSession, Router)
+                            ConfigurationTemplate, InternetExchange, PeeringSession, Router,
+                            statistics_cache)
 from peeringdb.models import Synchronization
 from utils.models import UserAction
 
@@ -52,16 +53,19 @@ class LogoutView(View):
 
 class Home(View):
     def get(self, request):
-        statistics = {
-            'as_count': AutonomousSystem.objects.count(),
-            'ix_count': InternetExchange.objects.count(),
-            'communities_count': Community.objects.count(),
-            'config_templates_count': ConfigurationTemplate.objects.count(),
-            'routers_count': Router.objects.count(),
-            'peering_sessions_count': PeeringSession.objects.count(),
-        }
+        def count():
+            return {
+                'as_count': AutonomousSystem.objects.count(),
+                'ix_count': InternetExchange.objects.count(),
+                'communities_count': Community.objects.count(),
+                'config_templates_count': ConfigurationTemplate.objects.count(),
+                'routers_count': Router.objects.count(),
+                'peering_sessions_count': PeeringSession.objects.count(),
+            }
+
+        # Invalidated when objects are created or deleted
         context = {
-            'statistics': statistics,
+            'statistics': statistics_cache.get_or_compute('counts', count),
             'history': UserAction.objects.select_related('user')[:50],
         }
         return render(request, 'home.html', context)
@@ -1,9 +1,16 @@
 from __future__ import unicode_literals
 
 from django.contrib import admin
-from .models import (Network, NetworkIXLAN, Prefix, Synchronization)
+from .models import (Facility, InternetExchange, InternetExchangeLAN, Network,
+                     NetworkIXLAN, Organization, Prefix, Synchronization,
+                     SynchronizationCheckpoint)
 
+admin.site.register(Organization)
+admin.site.register(Facility)
+admin.site.register(InternetExchange)
+admin.site.register(InternetExchangeLAN)
 admin.site.register(Network)
 admin.site.register(NetworkIXLAN)
 admin.site.register(Prefix)
 admin.site.register(Synchronization)
+admin.site.register(SynchronizationCheckpoint)
@@ -1,15 +1,31 @@
 from __future__ import unicode_literals
 
+import codecs
 import json
 import logging
 import requests
+import tempfile
+import threading
+import time
 
-from django.db import transaction
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.conf import settings
-from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-from .models import Network, NetworkIXLAN, Prefix, Synchronization
+from .models import (Facility, InternetExchange, InternetExchangeLAN, Network,
+                     NetworkIXLAN, Organization, Prefix, Synchronization,
+                     SynchronizationCheckpoint)
+from .prefixes import prefix_index
+from utils.cache import SharedCache
 
 
 NAMESPACES = {
@@ -25,17 +41,272 @@ NAMESPACES = {
     'network_contact': 'poc',
 }
 
+# Models used to cache the objects of some namespaces
+NAMESPACE_MODELS = {
+    NAMESPACES['organization']: Organization,
+    NAMESPACES['facility']: Facility,
+    NAMESPACES['internet_exchange']: InternetExchange,
+    NAMESPACES['internet_exchange_lan']: InternetExchangeLAN,
+    NAMESPACES['network']: Network,
+    NAMESPACES['network_internet_exchange_lan']: NetworkIXLAN,
+    NAMESPACES['internet_exchange_prefix']: Prefix,
+}
+
+# Fields of the cache models that are not part of PeeringDB records
+LOCAL_FIELDS = ('fetched',)
+
+# Number of objects handled by each query during a synchronization
+SYNC_CHUNK_SIZE = 500
+
+# Maximum number of values given to an __in filter of an API call, it keeps
+# URLs short enough for PeeringDB to accept them
+LOOKUP_CHUNK_SIZE = 100
+
+# Size in bytes of the chunks read when streaming an API response
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Responses of the API for which a request is tried again
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Maximum number of connections kept open to the API, the namespaces are
+# downloaded at the same time during synchronizations
+HTTP_POOL_SIZE = 10
+
+
+# Networks returned by PeeringDB.get_autonomous_system() indexed by ASN, shared
+# by all processes as synchronizations run in their own
+network_cache = SharedCache('peeringdb.networks',
+                            settings.LOOKUP_CACHE_TIMEOUT)
+
+
+def get_network_cache_statistics():
+    """
+    Returns the number of hits and misses of the network lookups cache for
+    this process.
+    """
+    return network_cache.get_statistics()
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of at most `size` items taken from the given iterable.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+class JSONRecordStream(object):
+    """
+    Incremental parser for JSON documents shaped like PeeringDB responses. It
+    reads the text chunk by chunk and yields the items of the list stored
+    under the given key of the top level object one at a time, so only one
+    item is kept in memory at once. Other keys are parsed and discarded.
+    """
+    WHITESPACES = ' \t\r\n'
+
+    def __init__(self, chunks, key='data'):
+        self.chunks = iter(chunks)
+        self.key = key
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.exhausted = False
+
+    def fill(self):
+        """
+        Appends the next chunk to the buffer, dropping what has already been
+        parsed. Returns False if there is nothing left to read.
+        """
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.exhausted = True
+            return False
+
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """
+        Returns the next non-whitespace character without consuming it.
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in self.WHITESPACES:
+                self.position += 1
+
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+
+            if not self.fill():
+                return ''
+
+    def consume(self, character):
+        if self.peek() == character:
+            self.position += 1
+            return True
+
+        return False
+
+    def expect(self, character):
+        if not self.consume(character):
+            raise ValueError('Expecting {!r} in JSON stream, found {!r}'.format(
+                character, self.peek()))
+
+    def decode(self):
+        """
+        Decodes the next JSON value, reading more chunks until it is complete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(
+                    self.buffer, self.position)
+                # A value ending with the buffer may be truncated (numbers)
+                if end < len(self.buffer) or self.exhausted:
+                    self.position = end
+                    return value
+            except ValueError:
+                if self.exhausted:
+                    raise
+
+            self.fill()
+
+    def iter_list(self):
+        self.expect('[')
+        if self.consume(']'):
+            return
+
+        while True:
+            yield self.decode()
+
+            if not self.consume(','):
+                self.expect(']')
+                return
+
+    def __iter__(self):
+        self.expect('{')
+        if self.consume('}'):
+            return
+
+        while True:
+            name = self.decode()
+            self.expect(':')
+
+            if name == self.key:
+                for item in self.iter_list():
+                    yield item
+            else:
+                self.decode()
+
+            if not self.consume(','):
+                self.expect('}')
+                return
+
 
 class Object(object):
     """
-    This is a class used to load JSON data into class fields for easier use.
+    This is a class used to access the values of a PeeringDB record as class
+    fields. The record is wrapped and never copied.
+
+    Subclasses with a property for each known field of a namespace are built
+    by get_object_class(), other fields are still reachable but slower.
     """
+    __slots__ = ('_data',)
+    namespace = None
 
     def __init__(self, data):
-        self.__dict__ = json.loads(json.dumps(data))
+        self._data = data
+
+    def __getattr__(self, name):
+        try:
+            return object.__getattribute__(self, '_data')[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __reduce__(self):
+        # Classes built on the fly cannot be found back by pickle
+        return (make_object, (self.namespace, self._data))
 
     def __str__(self):
-        return str(self.__dict__)
+        return str(self._data)
+
+
+def _field_property(name):
+    def getter(self):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    return property(getter)
+
+
+_object_classes = {}
+
+
+def get_object_class(namespace):
+    """
+    Returns the Object subclass for records of the given namespace. It is
+    built once using the fields of the model caching the namespace.
+    """
+    object_class = _object_classes.get(namespace)
+
+    if not object_class:
+        attributes = {'__slots__': (), 'namespace': namespace}
+        model = NAMESPACE_MODELS.get(namespace)
+        if model:
+            for field in model._meta.concrete_fields:
+                attributes[field.name] = _field_property(field.name)
+
+        object_class = type(str('{}Object'.format(namespace.capitalize())),
+                            (Object,), attributes)
+        _object_classes[namespace] = object_class
+
+    return object_class
+
+
+def make_object(namespace, data):
+    return get_object_class(namespace)(data)
+
+
+class PeeringDBError(Exception):
+    """
+    Raised when data cannot be retrieved from PeeringDB.
+    """
+    pass
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the HTTP session shared by the process, connections to PeeringDB
+    are kept open and reused.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            if settings.PEERINGDB_API_KEY:
+                session.headers['Authorization'] = 'Api-Key {}'.format(
+                    settings.PEERINGDB_API_KEY)
+            _session = session
+
+    return _session
 
 
 class PeeringDB(object):
@@ -44,9 +315,39 @@ class PeeringDB(object):
     """
     logger = logging.getLogger('peering.manager.peeringdb')
 
-    def lookup(self, namespace, search):
+    def get_retry_delay(self, response, attempt):
         """
-        Sends a get request to the API given a namespace and some parameters.
+        Returns the number of seconds to wait before trying a request again,
+        given by the Retry-After header if any, with an exponential backoff
+        otherwise. The delay never exceeds PEERINGDB_MAX_RETRY_DELAY seconds
+        as requests can be made while rendering pages.
+        """
+        delay = settings.PEERINGDB_BACKOFF * (2 ** attempt)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+
+        if retry_after:
+            try:
+                delay = max(0, int(retry_after))
+            except ValueError:
+                try:
+                    retry_date = parsedate_to_datetime(retry_after)
+                    if timezone.is_naive(retry_date):
+                        retry_date = timezone.make_aware(retry_date, timezone.utc)
+                    delay = max(0, (retry_date - timezone.now()).total_seconds())
+                except (TypeError, ValueError):
+                    self.logger.warning('ignoring invalid Retry-After header: %s',
+                                        retry_after)
+
+        return min(delay, settings.PEERINGDB_MAX_RETRY_DELAY)
+
+    def request(self, namespace, search, stream=False):
+        """
+        Sends a get request to the API given a namespace and some parameters
+        and returns the response.
+
+        Connection errors, throttled requests (429) and server errors are
+        retried up to PEERINGDB_RETRIES times. The last response is returned
+        whatever its status, the last connection error is raised.
         """
         # Enforce trailing slash and add namespace
         api_url = settings.PEERINGDB_API.strip('/') + '/' + namespace
@@ -55,11 +356,128 @@ class PeeringDB(object):
         if 'depth' not in search:
             search['depth'] = 1
 
-        # Make the request
-        self.logger.debug('calling api: %s | %s', api_url, search)
-        response = requests.get(api_url, params=search)
+        attempt = 0
+        while True:
+            # Make the request
+            self.logger.debug('calling api: %s | %s', api_url, search)
+            response = None
+            try:
+                response = get_session().get(api_url, params=search,
+                                             stream=stream,
+                                             timeout=settings.PEERINGDB_TIMEOUT)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                error = 'status {}'.format(response.status_code)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                if attempt >= settings.PEERINGDB_RETRIES:
+                    raise
+                error = e
+
+            if attempt >= settings.PEERINGDB_RETRIES:
+                return response
+
+            delay = self.get_retry_delay(response, attempt)
+            if response is not None:
+                response.close()
+
+            self.logger.warning('retrying api call %s in %s seconds (%s)',
+                                api_url, delay, error)
+            time.sleep(delay)
+            attempt += 1
+
+    def lookup(self, namespace, search):
+        """
+        Sends a get request to the API given a namespace and some parameters.
+        """
+        response = self.request(namespace, search)
+
+        if response.status_code != 200:
+            self.logger.error('api call to %s failed with status %s',
+                              namespace, response.status_code)
+            return None
+
+        return response.json()
+
+    def stream_lookup(self, namespace, search):
+        """
+        Same as lookup() but returns an iterator over the records of the
+        response, parsed while the body is being downloaded. The whole
+        response is never held in memory.
+        """
+        response = self.request(namespace, search, stream=True)
+
+        if response.status_code != 200:
+            response.close()
+            return None
+
+        return self.iter_response_records(response)
+
+    def iter_response_records(self, response):
+        try:
+            chunks = codecs.iterdecode(
+                response.iter_content(STREAM_CHUNK_SIZE), 'utf-8')
+            for record in JSONRecordStream(chunks):
+                yield record
+        finally:
+            response.close()
+
+    def download(self, namespace, search):
+        """
+        Downloads the response of a lookup to a temporary file and returns
+        the file, positioned at its beginning, or None if the request failed.
+        """
+        response = self.request(namespace, search, stream=True)
+
+        try:
+            if response.status_code != 200:
+                self.logger.error('cannot download %s, status %s', namespace,
+                                  response.status_code)
+                return None
+
+            downloaded = tempfile.TemporaryFile()
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                downloaded.write(chunk)
+            downloaded.seek(0)
+        finally:
+            response.close()
 
-        return response.json() if response.status_code == 200 else None
+        return downloaded
+
+    def download_namespaces(self, searches):
+        """
+        Downloads the given namespaces at the same time, given a dict of
+        search parameters indexed by namespace. Returns an ordered dict of
+        temporary files (or None for failed downloads) indexed by namespace.
+        """
+        downloads = OrderedDict()
+
+        with ThreadPoolExecutor(max_workers=len(searches)) as executor:
+            futures = [(namespace, executor.submit(self.download, namespace,
+                                                   search))
+                       for namespace, search in searches.items()]
+
+            for namespace, future in futures:
+                try:
+                    downloads[namespace] = future.result()
+                except requests.exceptions.RequestException as e:
+                    self.logger.error('cannot download %s: %s', namespace, e)
+                    downloads[namespace] = None
+
+        return downloads
+
+    def iter_file_records(self, downloaded):
+        """
+        Returns an iterator over the records of a downloaded response, they
+        are parsed as the file is read. The file is closed at the end.
+        """
+        try:
+            chunks = codecs.iterdecode(
+                iter(lambda: downloaded.read(STREAM_CHUNK_SIZE), b''), 'utf-8')
+            for record in JSONRecordStream(chunks):
+                yield record
+        finally:
+            downloaded.close()
 
     def record_last_sync(self, time, objects_changes):
         """
@@ -101,7 +519,168 @@ class PeeringDB(object):
 
         return int(last_sync_time)
 
-    def synchronize_objects(self, last_sync, namespace, model):
+    def build_local_object(self, model, data):
+        """
+        Returns an unsaved instance of the given model populated with the
+        values of a PeeringDB record. If the record does not pass the model
+        validation, None is returned.
+        """
+        values = {}
+        for field in model._meta.concrete_fields:
+            if field.name not in data and field.name not in LOCAL_FIELDS:
+                self.logger.error('bug found? field: %s for model: %s',
+                                  field.name, model._meta.verbose_name.lower())
+            values[field.attname] = data.get(field.name)
+
+        local_object = model(**values)
+
+        try:
+            # Uniqueness is checked by the database when saving, doing it
+            # here would cost one query per object
+            local_object.full_clean(validate_unique=False)
+        except ValidationError:
+            self.logger.error('bug found? error while validating id: %s for model: %s',
+                              data.get('id'), model._meta.verbose_name.lower())
+            return None
+
+        return local_object
+
+    def synchronize_chunk(self, model, records):
+        """
+        Applies a chunk of PeeringDB records to the local database using a
+        fixed number of queries whatever the size of the chunk is.
+
+        The IDs of the records are looked up in one query to find out which
+        objects already exist locally. Objects marked as deleted are removed
+        and the updated ones are replaced with a single delete query, then new
+        and updated objects are inserted with a single bulk query.
+
+        This function returns the number of objects that have been added,
+        updated and deleted.
+        """
+        known_ids = set(model.objects.filter(
+            pk__in=[data['id'] for data in records]).values_list('pk', flat=True))
+
+        objects_to_create = OrderedDict()
+        objects_to_update = OrderedDict()
+        ids_to_delete = set()
+
+        for data in records:
+            # Object marked as deleted so remove it locally too, ignore it if
+            # it was never known
+            if data.get('status') == 'deleted':
+                if data['id'] in known_ids:
+                    ids_to_delete.add(data['id'])
+                continue
+
+            local_object = self.build_local_object(model, data)
+            if not local_object:
+                continue
+
+            if local_object.pk in known_ids:
+                objects_to_update[local_object.pk] = local_object
+            else:
+                objects_to_create[local_object.pk] = local_object
+
+        try:
+            with transaction.atomic():
+                stale_ids = ids_to_delete.union(objects_to_update.keys())
+                if stale_ids:
+                    model.objects.filter(pk__in=stale_ids).delete()
+                model.objects.bulk_create(
+                    list(objects_to_create.values()) + list(objects_to_update.values()))
+        except IntegrityError:
+            # Something in the chunk breaks a constraint, fall back to saving
+            # objects one by one to only skip the faulty ones
+            self.logger.error('bug found? chunk of %s cannot be applied in bulk',
+                              model._meta.verbose_name_plural.lower())
+            return self.synchronize_chunk_slowly(
+                model, objects_to_create, objects_to_update, ids_to_delete)
+
+        return (len(objects_to_create), len(objects_to_update), len(ids_to_delete))
+
+    def synchronize_chunk_slowly(self, model, objects_to_create, objects_to_update, ids_to_delete):
+        """
+        Applies already sorted changes one object at a time. Objects that
+        cannot be saved are skipped and not counted.
+        """
+        objects_added = 0
+        objects_updated = 0
+
+        model.objects.filter(pk__in=ids_to_delete).delete()
+
+        for (local_objects, created) in [(objects_to_create, True), (objects_to_update, False)]:
+            for local_object in local_objects.values():
+                try:
+                    with transaction.atomic():
+                        local_object.save()
+                except IntegrityError:
+                    self.logger.error('bug found? error while saving id: %s for model: %s',
+                                      local_object.pk, model._meta.verbose_name.lower())
+                    continue
+
+                if created:
+                    objects_added += 1
+                else:
+                    objects_updated += 1
+
+        return (objects_added, objects_updated, len(ids_to_delete))
+
+    def get_watermark(self, records):
+        """
+        Returns the time of the most recent update of the given records as an
+        integer UNIX timestamp, 0 if there is none.
+        """
+        watermark = 0
+
+        for record in records:
+            updated = parse_datetime(record.get('updated') or '')
+            if not updated:
+                continue
+            if timezone.is_naive(updated):
+                updated = timezone.make_aware(updated, timezone.utc)
+            watermark = max(watermark, int(updated.timestamp()))
+
+        return watermark
+
+    def record_watermark(self, namespace, last_sync, watermark):
+        if not watermark:
+            return
+
+        checkpoint, _ = SynchronizationCheckpoint.objects.get_or_create(
+            namespace=namespace, defaults={'since': last_sync})
+        if watermark > checkpoint.watermark:
+            checkpoint.watermark = watermark
+            checkpoint.save()
+
+    def get_starting_points(self, namespaces, last_sync):
+        """
+        Returns a dict of the times from which objects must be synchronized
+        indexed by namespace.
+
+        It is the watermark of the namespace, the time of the most recent
+        update found in its objects, or the given time of the last
+        synchronization if there is no watermark. A namespace that has never
+        been entirely synchronized starts from the beginning. An interrupted
+        paginated synchronization keeps its starting point so it can be
+        resumed.
+        """
+        checkpoints = {checkpoint.namespace: checkpoint for checkpoint in
+                       SynchronizationCheckpoint.objects.filter(namespace__in=namespaces)}
+        starting_points = OrderedDict()
+
+        for namespace in namespaces:
+            checkpoint = checkpoints.get(namespace)
+            if not checkpoint or not checkpoint.synchronized:
+                starting_points[namespace] = 0
+            elif checkpoint.in_progress:
+                starting_points[namespace] = checkpoint.since
+            else:
+                starting_points[namespace] = checkpoint.watermark or last_sync
+
+        return starting_points
+
+    def synchronize_objects(self, last_sync, namespace, model, records=None):
         """
         Synchronizes all the objects of a namespace of the PeeringDB to the
         local database. This function is meant to be run regularly to update
@@ -113,6 +692,10 @@ class PeeringDB(object):
         If the object is marked as deleted in the PeeringDB, it will be locally
         deleted.
 
+        Objects are streamed from the API, unless an iterator over already
+        downloaded records is given, and processed in chunks of
+        SYNC_CHUNK_SIZE, see synchronize_chunk() for details.
+
         This function returns the number of objects that have been successfully
         synchronized to the local database.
         """
@@ -120,89 +703,127 @@ class PeeringDB(object):
         objects_updated = 0
         objects_deleted = 0
 
-        # Get all network changes since the last sync
-        search = {'since': last_sync, 'depth': 0}
-        result = self.lookup(namespace, search)
+        # Get all network changes since the last sync, records are parsed
+        # while being downloaded to keep the memory usage flat
+        result = records
+        if result is None:
+            search = {'since': last_sync, 'depth': 0}
+            result = self.stream_lookup(namespace, search)
 
-        if not result:
+        if result is None:
             return None
 
-        for data in result['data']:
-            peeringdb_object = Object(data)
-            marked_as_deleted = peeringdb_object.status == 'deleted'
-            marked_as_new = False
+        watermark = 0
+        for records in chunked(result, SYNC_CHUNK_SIZE):
+            added, updated, deleted = self.synchronize_chunk(model, records)
+            objects_added += added
+            objects_updated += updated
+            objects_deleted += deleted
+            watermark = max(watermark, self.get_watermark(records))
 
-            try:
-                # Get the local object by its ID
-                local_object = model.objects.get(pk=peeringdb_object.id)
-
-                # Object marked as deleted so remove it locally too
-                if marked_as_deleted:
-                    local_object.delete()
-                    objects_deleted += 1
-                    self.logger.debug('deleted %s #%s from local database',
-                                      model._meta.verbose_name.lower(), peeringdb_object.id)
-                    continue
-            except model.DoesNotExist:
-                # Local object does not exist so create it
-                local_object = model()
-                marked_as_new = True
+        self.record_watermark(namespace, last_sync, watermark)
 
-            # Set the value for each field
-            for model_field in model._meta.get_fields():
-                field_name = model_field.name
-                value = getattr(peeringdb_object, field_name)
+        self.logger.debug('synchronized %s: %s added, %s updated, %s deleted',
+                          model._meta.verbose_name_plural.lower(), objects_added,
+                          objects_updated, objects_deleted)
 
-                try:
-                    field = local_object._meta.get_field(field_name)
-                except FieldDoesNotExist:
-                    field = None
-                    self.logger.error(
-                        'bug found? field: %s for model: %s', field_name, model._meta.verbose_name.lower())
+        return (objects_added, objects_updated, objects_deleted)
 
-                if field:
-                    setattr(local_object, field_name, value)
+    def synchronize_objects_by_page(self, last_sync, namespace, model, page_size):
+        """
+        Same as synchronize_objects() but objects are requested by pages of
+        `page_size` objects, each page being written in its own transaction.
 
-            try:
-                local_object.full_clean()
-            except ValidationError:
-                self.logger.error('bug found? error while validating id: %s for model: %s',
-                                  peeringdb_object.id, model._meta.verbose_name.lower())
-                continue
+        The progress is recorded in a SynchronizationCheckpoint after each
+        page, if the synchronization is interrupted it resumes with the first
+        page that has not been written yet.
+        """
+        checkpoint, _ = SynchronizationCheckpoint.objects.get_or_create(
+            namespace=namespace, defaults={'since': last_sync})
 
-            # Save the local object
-            local_object.save()
+        # Left by a synchronization which started from another point
+        if checkpoint.since != last_sync:
+            checkpoint.reset(last_sync)
 
-            # Update counters
-            if marked_as_new:
-                objects_added += 1
-                self.logger.debug(
-                    'created %s #%s from peeringdb', model._meta.verbose_name.lower(), local_object.id)
-            else:
-                objects_updated += 1
-                self.logger.debug(
-                    'updated %s #%s from peeringdb', model._meta.verbose_name.lower(), local_object.id)
+        if checkpoint.skip:
+            self.logger.info('resuming %s synchronization after %s objects',
+                             namespace, checkpoint.skip)
 
-        return (objects_added, objects_updated, objects_deleted)
+        while not checkpoint.complete:
+            search = {'since': last_sync, 'depth': 0, 'limit': page_size,
+                      'skip': checkpoint.skip}
+            result = self.stream_lookup(namespace, search)
+
+            if result is None:
+                return None
+
+            records = list(result)
+
+            with transaction.atomic():
+                for chunk in chunked(records, SYNC_CHUNK_SIZE):
+                    added, updated, deleted = self.synchronize_chunk(
+                        model, chunk)
+                    checkpoint.added += added
+                    checkpoint.updated += updated
+                    checkpoint.deleted += deleted
+
+                checkpoint.skip += len(records)
+                checkpoint.complete = len(records) < page_size
+                checkpoint.watermark = max(checkpoint.watermark,
+                                           self.get_watermark(records))
+                checkpoint.save()
+
+            self.logger.debug('synchronized %s %s', checkpoint.skip,
+                              model._meta.verbose_name_plural.lower())
+
+        return (checkpoint.added, checkpoint.updated, checkpoint.deleted)
+
+    def update_local_database(self, last_sync, page_size=None):
+        """
+        Synchronizes the cached objects (organizations, facilities, IXs, IX
+        LANs, networks, network IX LANs and prefixes) changed since the last
+        synchronization.
 
-    def update_local_database(self, last_sync):
+        By default everything is downloaded then written in one transaction.
+        If a page size is given, objects are synchronized page by page and an
+        interrupted synchronization can be resumed.
+        """
         # Set time of sync
         time_of_sync = timezone.now()
         objects_to_sync = [
+            (NAMESPACES['organization'], Organization),
+            (NAMESPACES['facility'], Facility),
+            (NAMESPACES['internet_exchange'], InternetExchange),
+            (NAMESPACES['internet_exchange_lan'], InternetExchangeLAN),
             (NAMESPACES['network'], Network),
             (NAMESPACES['network_internet_exchange_lan'], NetworkIXLAN),
             (NAMESPACES['internet_exchange_prefix'], Prefix),
         ]
         list_of_changes = []
+        starting_points = self.get_starting_points(
+            [namespace for namespace, _ in objects_to_sync], last_sync)
+
+        if page_size:
+            # When resuming, changes made since the first attempt may have
+            # been missed in the pages already written
+            checkpoint = SynchronizationCheckpoint.objects.filter(
+                Q(skip__gt=0) | Q(complete=True)).order_by('started').first()
+            if checkpoint:
+                time_of_sync = checkpoint.started
 
-        # Make a single transaction, avoid too much database commits (poor
-        # speed) and fail the whole synchronization if something goes wrong
-        with transaction.atomic():
-            # Try to sync objects
             for (namespace, object_type) in objects_to_sync:
-                changes = self.synchronize_objects(
-                    last_sync, namespace, object_type)
+                changes = self.synchronize_objects_by_page(
+                    starting_points[namespace], namespace, object_type,
+                    page_size)
+
+                if changes is None:
+                    raise PeeringDBError('Cannot synchronize {} from PeeringDB, run the synchronization again to resume it.'.format(
+                        namespace))
+
                 list_of_changes.append(changes)
+        else:
+            list_of_changes = self.synchronize_downloaded_objects(
+                starting_points, objects_to_sync)
 
         objects_changes = {
             'added': sum(added for added, _, _ in list_of_changes),
@@ -210,8 +831,200 @@ class PeeringDB(object):
             'deleted': sum(deleted for _, _, deleted in list_of_changes),
         }
 
-        # Save the last sync time
-        self.record_last_sync(time_of_sync, objects_changes)
+        # Save the last sync time, all namespaces are now entirely
+        # synchronized and progress of paginated synchronizations is not
+        # needed anymore
+        with transaction.atomic():
+            self.record_last_sync(time_of_sync, objects_changes)
+            for namespace, _ in objects_to_sync:
+                SynchronizationCheckpoint.objects.get_or_create(
+                    namespace=namespace,
+                    defaults={'since': starting_points[namespace]})
+            SynchronizationCheckpoint.objects.update(
+                skip=0, complete=False, added=0, updated=0, deleted=0,
+                synchronized=time_of_sync)
+
+        # Update the prefix index of this process if it is used, the others
+        # notice the new synchronization by themselves
+        if prefix_index.loaded:
+            prefix_index.refresh()
+        network_cache.invalidate()
+
+    def synchronize_downloaded_objects(self, starting_points, objects_to_sync):
+        """
+        Downloads the given namespaces and writes them in a single transaction.
+        Returns the list of changes for each namespace.
+        """
+        list_of_changes = []
+
+        # Download all namespaces at once before touching the database so the
+        # transaction only lasts for the time needed to write the changes
+        downloads = self.download_namespaces(OrderedDict(
+            (namespace, {'since': since, 'depth': 0})
+            for namespace, since in starting_points.items()))
+
+        # Synchronizing only some namespaces would leave the cache
+        # inconsistent
+        failed = [namespace for namespace, downloaded in downloads.items()
+                  if not downloaded]
+        if failed:
+            for downloaded in downloads.values():
+                if downloaded:
+                    downloaded.close()
+            raise PeeringDBError('Cannot download {} from PeeringDB, nothing has been synchronized.'.format(
+                ', '.join(failed)))
+
+        try:
+            # Make a single transaction, avoid too much database commits (poor
+            # speed) and fail the whole synchronization if something goes
+            # wrong
+            with transaction.atomic():
+                # Try to sync objects
+                for (namespace, object_type) in objects_to_sync:
+                    changes = self.synchronize_objects(
+                        starting_points[namespace], namespace, object_type,
+                        records=self.iter_file_records(downloads[namespace]))
+                    list_of_changes.append(changes)
+        finally:
+            for downloaded in downloads.values():
+                if downloaded:
+                    downloaded.close()
+
+        return list_of_changes
+
+    def lookup_many(self, namespace, field, values):
+        """
+        Returns the records of a namespace whose given field matches one of
+        the given values. Values are sent in chunks with __in filters so a
+        single API call is made for up to LOOKUP_CHUNK_SIZE of them. None is
+        returned if one of the calls fails.
+        """
+        records = []
+
+        for chunk in chunked(sorted(set(values)), LOOKUP_CHUNK_SIZE):
+            search = {
+                '{}__in'.format(field): ','.join(str(value) for value in chunk),
+                'depth': 0,
+            }
+            result = self.lookup(namespace, search)
+
+            if not result:
+                return None
+
+            records.extend(result['data'])
+
+        return records
+
+    def cache_records(self, namespace, records):
+        """
+        Writes records fetched online to the local database so they do not
+        need to be fetched again. They are marked with the time they have been
+        fetched at and are considered fresh for PEERINGDB_FETCHED_TIMEOUT
+        seconds, or until they are synchronized. Records that do not pass the
+        validation are ignored.
+        """
+        model = NAMESPACE_MODELS[namespace]
+        fetched = timezone.now()
+
+        for chunk in chunked(records, SYNC_CHUNK_SIZE):
+            self.synchronize_chunk(model, [dict(data, fetched=fetched)
+                                           for data in chunk])
+
+        if model is Network:
+            network_cache.invalidate()
+
+    def fresh(self, queryset):
+        """
+        Excludes the objects fetched online for too long from the given
+        queryset. Synchronized objects are always fresh.
+        """
+        return queryset.exclude(fetched__lt=timezone.now() - timedelta(
+            seconds=settings.PEERINGDB_FETCHED_TIMEOUT))
+
+    def is_synchronized(self, namespaces):
+        """
+        Tells if the given namespaces have all been entirely synchronized at
+        least once. Until then, some of their objects may be missing from the
+        local database even if related objects are there.
+        """
+        return SynchronizationCheckpoint.objects.filter(
+            namespace__in=namespaces,
+            synchronized__isnull=False).count() == len(namespaces)
+
+    def with_ix_networks(self, networks):
+        """
+        Keeps the fresh networks of the given queryset whose IX networks are
+        all cached: synchronized ones once both namespaces have been entirely
+        synchronized, fetched ones otherwise.
+        """
+        networks = self.fresh(networks)
+
+        if self.is_synchronized([NAMESPACES['network'],
+                                 NAMESPACES['network_internet_exchange_lan']]):
+            return networks
+
+        return networks.filter(fetched__isnull=False)
+
+    def get_missing_key(self, namespace, field, value):
+        return 'peeringdb.missing.{}.{}.{}'.format(namespace, field, value)
+
+    def get_known_missing(self, namespace, field, values):
+        """
+        Returns the values for which no objects were found online recently,
+        they do not need to be looked up again.
+        """
+        keys = {self.get_missing_key(namespace, field, value): value
+                for value in values}
+        return set(keys[key] for key in cache.get_many(keys))
+
+    def record_missing(self, namespace, field, values):
+        """
+        Remembers that no objects were found online for the given values for
+        PEERINGDB_MISSING_TIMEOUT seconds.
+        """
+        cache.set_many({self.get_missing_key(namespace, field, value): True
+                        for value in values},
+                       settings.PEERINGDB_MISSING_TIMEOUT)
+
+    def get_objects(self, namespace, field, values, store=True):
+        """
+        Returns a dict of objects indexed by the value of the given field.
+        Fresh cached objects are retrieved from the local database with one
+        query per chunk of values, the missing ones are fetched online with
+        chunked API calls and stored in the local database unless store is
+        False. Objects that cannot be found at all are not part of the dict,
+        they are not looked up again for a while.
+        """
+        model = NAMESPACE_MODELS[namespace]
+        values = set(values)
+        objects = {}
+
+        # Try to get from cached data
+        for chunk in chunked(values, SYNC_CHUNK_SIZE):
+            for local_object in self.fresh(model.objects.filter(**{'{}__in'.format(field): chunk})):
+                objects[getattr(local_object, field)] = local_object
+
+        # If no cached data found, query the API
+        missing_values = values.difference(objects)
+        missing_values.difference_update(self.get_known_missing(
+            namespace, field, missing_values))
+        if missing_values:
+            records = self.lookup_many(namespace, field, missing_values)
+
+            # Nothing can be told about missing objects if the lookup failed
+            if records is None:
+                return objects
+
+            if store:
+                self.cache_records(namespace, records)
+
+            for data in records:
+                objects[data[field]] = make_object(namespace, data)
+
+            self.record_missing(namespace, field,
+                                missing_values.difference(objects))
+
+        return objects
 
     def get_autonomous_system(self, asn):
         """
@@ -220,20 +1033,41 @@ class PeeringDB(object):
         the AS details are not found in the local database, they will be
         fetched online which will take more time.
         """
-        try:
-            # Try to get from cached data
-            network = Network.objects.get(asn=asn)
-        except Network.DoesNotExist:
-            # If no cached data found, query the API
-            search = {'asn': asn}
-            result = self.lookup(NAMESPACES['network'], search)
+        # Failed lookups are not remembered
+        return network_cache.get_or_compute(
+            asn, lambda: self.get_autonomous_systems([asn]).get(asn),
+            store=lambda network: network is not None)
 
-            if not result:
-                return None
-
-            network = Object(result['data'][0])
+    def get_autonomous_systems(self, asns):
+        """
+        Return a dict of ASes (and their details) indexed by ASN given a list
+        of ASNs. Cached ASes are retrieved from the local database, the missing
+        ones are fetched online with as few API calls as possible and stored
+        in the local database with the IX networks they are connected to. ASes
+        that cannot be found at all are not part of the dict.
+        """
+        asns = set(asns)
+        cached_asns = set()
+        for chunk in chunked(asns, SYNC_CHUNK_SIZE):
+            cached_asns.update(self.with_ix_networks(Network.objects.filter(
+                asn__in=chunk)).values_list('asn', flat=True))
+
+        # A cached AS always comes with all its IX networks, the missing ASes
+        # are not cached if their IX networks cannot be retrieved
+        store = True
+        missing_asns = asns.difference(cached_asns)
+        missing_asns.difference_update(self.get_known_missing(
+            NAMESPACES['network'], 'asn', missing_asns))
+        if missing_asns:
+            namespace = NAMESPACES['network_internet_exchange_lan']
+            records = self.lookup_many(namespace, 'asn', missing_asns)
+            if records is None:
+                store = False
+            else:
+                self.cache_records(namespace, records)
 
-        return network
+        return self.get_objects(NAMESPACES['network'], 'asn', asns,
+                                store=store)
 
     def get_ix_network(self, ix_network_id):
         """
@@ -242,43 +1076,33 @@ class PeeringDB(object):
         command). If the IX network is not found in the local database, it will
         be fetched online which will take more time.
         """
-        try:
-            # Try to get from cached data
-            network_ixlan = NetworkIXLAN.objects.get(id=ix_network_id)
-        except NetworkIXLAN.DoesNotExist:
-            # If no cached data found, query the API
-            search = {'id': ix_network_id}
-            result = self.lookup(
-                NAMESPACES['network_internet_exchange_lan'], search)
-
-            if not result:
-                return None
+        return self.get_ix_networks([ix_network_id]).get(ix_network_id)
 
-            network_ixlan = Object(result['data'][0])
-
-        return network_ixlan
+    def get_ix_networks(self, ix_network_ids):
+        """
+        Return a dict of IX networks (and their details) indexed by ID given a
+        list of IDs. Missing IX networks are fetched online with as few API
+        calls as possible and stored in the local database.
+        """
+        return self.get_objects(
+            NAMESPACES['network_internet_exchange_lan'], 'id', ix_network_ids)
 
     def get_ix_networks_for_asn(self, asn):
         """
-        Returns a list of all IX networks an AS is connected to.
+        Returns a list of all IX networks an AS is connected to, or None if
+        they cannot be retrieved.
         """
-        # Try to get from cached data
-        network_ixlans = NetworkIXLAN.objects.filter(asn=asn)
-
-        # If nothing found in cache, try to fetch data online
-        if not network_ixlans:
-            search = {'asn': asn}
-            result = self.lookup(
-                NAMESPACES['network_internet_exchange_lan'], search)
-
-            if not result:
+        # All the IX networks of a cached AS are cached, if the AS is not
+        # cached get it online with its IX networks, the lookups cache is not
+        # used as it does not fetch the IX networks
+        if not self.with_ix_networks(Network.objects.filter(asn=asn)).exists():
+            if asn not in self.get_autonomous_systems([asn]):
+                # An AS not found online is connected to no IXs
+                if self.get_known_missing(NAMESPACES['network'], 'asn', [asn]):
+                    return NetworkIXLAN.objects.none()
                 return None
 
-            network_ixlans = []
-            for ix_network in result['data']:
-                network_ixlans.append(Object(ix_network))
-
-        return network_ixlans
+        return NetworkIXLAN.objects.filter(asn=asn)
 
     def get_prefixes_for_ix_network(self, ix_network_id):
         """
@@ -290,22 +1114,29 @@ class PeeringDB(object):
         network_ixlan = self.get_ix_network(ix_network_id)
 
         if network_ixlan:
-            # Try to get prefixes from cache
-            ix_prefixes = Prefix.objects.filter(
-                ixlan_id=network_ixlan.ixlan_id)
-
-            # If not cached data, try to fetch online
-            if not ix_prefixes:
-                search = {'ixlan_id': network_ixlan.ixlan_id}
-                result = self.lookup(
-                    NAMESPACES['internet_exchange_prefix'], search)
+            # Try to get prefixes from cache, until prefixes have been
+            # entirely synchronized only the fetched ones are complete
+            ix_prefixes = self.fresh(Prefix.objects.filter(
+                ixlan_id=network_ixlan.ixlan_id))
+            synchronized = self.is_synchronized([
+                NAMESPACES['internet_exchange_lan'],
+                NAMESPACES['internet_exchange_prefix']])
+            if not synchronized:
+                ix_prefixes = ix_prefixes.filter(fetched__isnull=False)
+
+            # If not cached data, try to fetch online unless the IX LAN is
+            # cached, it has no prefixes then
+            if not ix_prefixes and not (synchronized and InternetExchangeLAN.objects.filter(id=network_ixlan.ixlan_id).exists()):
+                namespace = NAMESPACES['internet_exchange_prefix']
+                search = {'ixlan_id': network_ixlan.ixlan_id, 'depth': 0}
+                result = self.lookup(namespace, search)
 
                 if not result:
                     return prefixes
 
-                ix_prefixes = []
-                for ix_prefix in result['data']:
-                    ix_prefixes.append(Object(ix_prefix))
+                self.cache_records(namespace, result['data'])
+                ix_prefixes = [make_object(namespace, ix_prefix)
+                               for ix_prefix in result['data']]
 
             # Build a list with protocol and prefix couples
             for ix_prefix in ix_prefixes:
@@ -320,39 +1151,41 @@ class PeeringDB(object):
         """
         Returns a dict with details for peers for the IX corresponding to the
         given ID. This function try to leverage the use of local database
-        caching. If the cache is not built it can take some time to execute due
-        to the amount of peers on the IX which increases the number of API
-        calls to be made.
+        caching. If the cache is not built, the networks of the peers are
+        fetched online by batches and cached for the next calls.
         """
-        # Try to get from cached data
-        network_ixlans = NetworkIXLAN.objects.filter(ix_id=ix_id)
-
-        # If nothing found in cache, try to fetch data online
-        if not network_ixlans:
-            search = {'ix_id': ix_id}
-            result = self.lookup(
-                NAMESPACES['network_internet_exchange_lan'], search)
+        # Try to get from cached data, once synchronized all the networks of
+        # a cached IX are cached, some networks may be missing otherwise
+        if self.is_synchronized([NAMESPACES['internet_exchange'],
+                                 NAMESPACES['network_internet_exchange_lan']]) and \
+                InternetExchange.objects.filter(id=ix_id).exists():
+            network_ixlans = NetworkIXLAN.objects.filter(ix_id=ix_id)
+        else:
+            # If the IX is not cached, query the API and cache the networks
+            namespace = NAMESPACES['network_internet_exchange_lan']
+            result = self.lookup(namespace, {'ix_id': ix_id, 'depth': 0})
 
             if not result:
                 return None
 
-            network_ixlans = []
-            for data in result['data']:
-                network_ixlans.append(Object(data))
+            self.cache_records(namespace, result['data'])
+            network_ixlans = [make_object(namespace, data)
+                              for data in result['data']]
+
+        # Ignore our own ASN
+        network_ixlans = [network_ixlan for network_ixlan in network_ixlans
+                          if network_ixlan.asn != settings.MY_ASN]
+
+        # Get more details about all networks at once
+        networks = self.get_autonomous_systems(
+            [network_ixlan.asn for network_ixlan in network_ixlans])
 
         # List potential peers
         peers = []
         for network_ixlan in network_ixlans:
-            # Ignore our own ASN
-            if network_ixlan.asn == settings.MY_ASN:
-                continue
-
-            # Get more details about the current network
-            network = self.get_autonomous_system(network_ixlan.asn)
-
             # Package all gathered details
             peers.append({
-                'network': network,
+                'network': networks.get(network_ixlan.asn),
                 'network_ixlan': network_ixlan,
             })
 
@@ -5,3 +5,7 @@ from django.apps import AppConfig
 
 class PeeringdbConfig(AppConfig):
     name = 'peeringdb'
+
+    def ready(self):
+        # Connect signal receivers
+        from . import signals  # noqa: F401
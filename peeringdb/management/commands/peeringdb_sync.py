@@ -2,17 +2,26 @@ from __future__ import unicode_literals
 
 import logging
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from peeringdb.api import PeeringDB
+from peeringdb.api import PeeringDB, PeeringDBError
 
 
 class Command(BaseCommand):
     help = 'Sync known networks of PeeringDB.'
     logger = logging.getLogger('peering.manager.peeringdb')
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size', type=int, default=None,
+            help='Synchronize objects by pages of the given size, an interrupted synchronization resumes where it stopped.')
+
     def handle(self, *args, **options):
         self.logger.info('Syncing networks with PeeringDB...')
 
         api = PeeringDB()
-        api.update_local_database(api.get_last_sync_time())
+        try:
+            api.update_local_database(api.get_last_sync_time(),
+                                      page_size=options['page_size'])
+        except PeeringDBError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.10 on 2026-10-18 15:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('peeringdb', '0006_auto_20180213_0031'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SynchronizationCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(max_length=16, unique=True)),
+                ('since', models.PositiveIntegerField()),
+                ('started', models.DateTimeField(default=django.utils.timezone.now)),
+                ('skip', models.PositiveIntegerField(default=0)),
+                ('complete', models.BooleanField(default=False)),
+                ('added', models.PositiveIntegerField(default=0)),
+                ('updated', models.PositiveIntegerField(default=0)),
+                ('deleted', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['namespace'],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.10 on 2026-10-18 15:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('peeringdb', '0007_synchronizationcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synchronizationcheckpoint',
+            name='watermark',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.10 on 2026-10-18 16:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('peeringdb', '0008_synchronizationcheckpoint_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Facility',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('org_id', models.PositiveIntegerField(db_index=True)),
+                ('name', models.CharField(max_length=255)),
+                ('website', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('country', models.CharField(blank=True, max_length=7)),
+            ],
+            options={
+                'verbose_name_plural': 'facilities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InternetExchange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('org_id', models.PositiveIntegerField(db_index=True)),
+                ('name', models.CharField(max_length=255)),
+                ('name_long', models.CharField(blank=True, max_length=255)),
+                ('website', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('country', models.CharField(blank=True, max_length=7)),
+            ],
+            options={
+                'verbose_name': 'IX',
+                'verbose_name_plural': 'IXs',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InternetExchangeLAN',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ix_id', models.PositiveIntegerField(db_index=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('descr', models.TextField(blank=True)),
+                ('mtu', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'IX LAN',
+                'verbose_name_plural': 'IX LANs',
+                'ordering': ['ix_id', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Organization',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('website', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('country', models.CharField(blank=True, max_length=7)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+    ]
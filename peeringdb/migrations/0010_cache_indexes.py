@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.10 on 2026-10-18 16:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('peeringdb', '0009_cache_models'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='networkixlan',
+            index=models.Index(fields=['asn'], name='peeringdb_netixlan_asn'),
+        ),
+        migrations.AddIndex(
+            model_name='networkixlan',
+            index=models.Index(fields=['ix_id', 'asn'], name='peeringdb_netixlan_ix_asn'),
+        ),
+        migrations.AddIndex(
+            model_name='networkixlan',
+            index=models.Index(fields=['ixlan_id'], name='peeringdb_netixlan_ixlan'),
+        ),
+        migrations.AddIndex(
+            model_name='prefix',
+            index=models.Index(fields=['ixlan_id'], name='peeringdb_prefix_ixlan'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.10 on 2026-10-18 18:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('peeringdb', '0010_cache_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='network',
+            name='fetched',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='networkixlan',
+            name='fetched',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prefix',
+            name='fetched',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
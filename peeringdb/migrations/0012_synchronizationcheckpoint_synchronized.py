@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.10 on 2026-10-18 20:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def mark_synchronized_namespaces(apps, schema_editor):
+    """
+    Networks, network IX LANs and prefixes were entirely synchronized by the
+    previous synchronizations. Other namespaces have been added later and
+    must be synchronized from the beginning.
+    """
+    Synchronization = apps.get_model('peeringdb', 'Synchronization')
+    SynchronizationCheckpoint = apps.get_model('peeringdb',
+                                               'SynchronizationCheckpoint')
+
+    last_sync = Synchronization.objects.order_by('-time').first()
+    if not last_sync:
+        return
+
+    for namespace in ['net', 'netixlan', 'ixpfx']:
+        checkpoint, _ = SynchronizationCheckpoint.objects.get_or_create(
+            namespace=namespace,
+            defaults={'since': int(last_sync.time.timestamp())})
+        checkpoint.synchronized = last_sync.time
+        checkpoint.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('peeringdb', '0011_fetched'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synchronizationcheckpoint',
+            name='synchronized',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_synchronized_namespaces,
+                             migrations.RunPython.noop),
+    ]
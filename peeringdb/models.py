@@ -1,16 +1,79 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.utils import timezone
 
 from peering.fields import ASNField
 
 
+class Organization(models.Model):
+    name = models.CharField(max_length=255)
+    website = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=255, blank=True)
+    country = models.CharField(max_length=7, blank=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Facility(models.Model):
+    org_id = models.PositiveIntegerField(db_index=True)
+    name = models.CharField(max_length=255)
+    website = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=255, blank=True)
+    country = models.CharField(max_length=7, blank=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'facilities'
+
+    def __str__(self):
+        return self.name
+
+
+class InternetExchange(models.Model):
+    org_id = models.PositiveIntegerField(db_index=True)
+    name = models.CharField(max_length=255)
+    name_long = models.CharField(max_length=255, blank=True)
+    website = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=255, blank=True)
+    country = models.CharField(max_length=7, blank=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'IX'
+        verbose_name_plural = 'IXs'
+
+    def __str__(self):
+        return self.name
+
+
+class InternetExchangeLAN(models.Model):
+    ix_id = models.PositiveIntegerField(db_index=True)
+    name = models.CharField(max_length=255, blank=True)
+    descr = models.TextField(blank=True)
+    mtu = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['ix_id', 'name']
+        verbose_name = 'IX LAN'
+        verbose_name_plural = 'IX LANs'
+
+    def __str__(self):
+        return 'IX LAN {} of IX {}'.format(self.id, self.ix_id)
+
+
 class Network(models.Model):
     asn = ASNField(unique=True)
     name = models.CharField(max_length=255)
     irr_as_set = models.CharField(max_length=255, blank=True, null=True)
     info_prefixes6 = models.PositiveIntegerField(blank=True, null=True)
     info_prefixes4 = models.PositiveIntegerField(blank=True, null=True)
+    # Set when the object has been fetched online instead of synchronized
+    fetched = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['asn']
@@ -29,9 +92,17 @@ class NetworkIXLAN(models.Model):
     is_rs_peer = models.BooleanField(default=False)
     ix_id = models.PositiveIntegerField()
     ixlan_id = models.PositiveIntegerField()
+    # Set when the object has been fetched online instead of synchronized
+    fetched = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['asn', 'ipaddr6', 'ipaddr4']
+        indexes = [
+            models.Index(fields=['asn'], name='peeringdb_netixlan_asn'),
+            models.Index(fields=['ix_id', 'asn'],
+                         name='peeringdb_netixlan_ix_asn'),
+            models.Index(fields=['ixlan_id'], name='peeringdb_netixlan_ixlan'),
+        ]
         verbose_name = 'Network IX LAN'
         verbose_name_plural = 'Network IX LANs'
 
@@ -43,9 +114,14 @@ class Prefix(models.Model):
     protocol = models.CharField(max_length=8)
     prefix = models.CharField(max_length=64)
     ixlan_id = models.PositiveIntegerField()
+    # Set when the object has been fetched online instead of synchronized
+    fetched = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['prefix']
+        indexes = [
+            models.Index(fields=['ixlan_id'], name='peeringdb_prefix_ixlan'),
+        ]
         verbose_name = 'IX Prefix'
         verbose_name_plural = 'IX Prefixes'
 
@@ -64,3 +140,38 @@ class Synchronization(models.Model):
 
     def __str__(self):
         return 'Synced {} objects at {}'.format((self.added + self.deleted + self.updated), self.time)
+
+
+class SynchronizationCheckpoint(models.Model):
+    namespace = models.CharField(max_length=16, unique=True)
+    watermark = models.PositiveIntegerField(default=0)
+    since = models.PositiveIntegerField()
+    started = models.DateTimeField(default=timezone.now)
+    skip = models.PositiveIntegerField(default=0)
+    complete = models.BooleanField(default=False)
+    added = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    # Time of the last synchronization of the whole namespace, None until the
+    # namespace has been entirely synchronized once
+    synchronized = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['namespace']
+
+    @property
+    def in_progress(self):
+        return self.skip > 0 or self.complete
+
+    def reset(self, since):
+        self.since = since
+        self.started = timezone.now()
+        self.skip = 0
+        self.complete = False
+        self.added = 0
+        self.updated = 0
+        self.deleted = 0
+        self.save()
+
+    def __str__(self):
+        return '{} synced up to {} objects since {}'.format(self.namespace, self.skip, self.since)
@@ -0,0 +1,203 @@
+from __future__ import unicode_literals
+
+import ipaddress
+import logging
+import threading
+
+from collections import defaultdict, namedtuple
+
+from .models import InternetExchangeLAN, Prefix, Synchronization
+
+
+# Result of a lookup, ix_id is None if the IX LAN is not cached
+PrefixMatch = namedtuple('PrefixMatch', ['prefix', 'ixlan_id', 'ix_id'])
+
+
+class PrefixTree(object):
+    """
+    Binary radix tree of the prefixes of one IP version. Each node is a list
+    holding its two children and the values of its prefix indexed by key, a
+    lookup walks down at most one node per bit of the address and returns the
+    value of the longest prefix containing it.
+
+    The same prefix can be inserted with several keys, it stays in the tree
+    until all of them are removed. A lookup then returns the value of the
+    smallest key.
+    """
+
+    def __init__(self, max_prefixlen):
+        self.max_prefixlen = max_prefixlen
+        self.root = [None, None, None]
+
+    def bits(self, network, length):
+        value = int(network)
+        for position in range(self.max_prefixlen - 1,
+                              self.max_prefixlen - 1 - length, -1):
+            yield (value >> position) & 1
+
+    def insert(self, network, key, value):
+        node = self.root
+        for bit in self.bits(network.network_address, network.prefixlen):
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            node[2] = {}
+        node[2][key] = value
+
+    def remove(self, network, key):
+        # Nodes are kept, they are reused when the prefix comes back
+        node = self.root
+        for bit in self.bits(network.network_address, network.prefixlen):
+            node = node[bit]
+            if node is None:
+                return
+        if node[2] is not None:
+            node[2].pop(key, None)
+            if not node[2]:
+                node[2] = None
+
+    def lookup(self, ip_address):
+        node = self.root
+        values = node[2]
+        for bit in self.bits(ip_address, self.max_prefixlen):
+            node = node[bit]
+            if node is None:
+                break
+            if node[2] is not None:
+                values = node[2]
+        return values[min(values)] if values else None
+
+
+class IXLANClassifier(object):
+    """
+    Tells if IP addresses are part of the prefixes of an IX LAN.
+    """
+
+    def __init__(self, index, ixlan_id):
+        self.index = index
+        self.ixlan_id = ixlan_id
+
+    def __contains__(self, ip_address):
+        match = self.index.lookup(ip_address)
+        return match is not None and match.ixlan_id == self.ixlan_id
+
+
+class PrefixIndex(object):
+    """
+    Per-process index of the IX LAN prefixes cached in the local database,
+    used to find the IX LAN an IP address belongs to.
+
+    The index is loaded on first use and refreshed when a new PeeringDB
+    synchronization is found. Only prefixes added, changed or removed since
+    the previous load are updated in the trees.
+    """
+    logger = logging.getLogger('peering.manager.peeringdb')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Empties the index, it is loaded again on next use.
+        """
+        with self.lock:
+            self.trees = {4: PrefixTree(32), 6: PrefixTree(128)}
+            self.prefixes = {}
+            self.ixlans = defaultdict(int)
+            self.ix_ids = {}
+            self.loaded = False
+            self.version = None
+
+    def get_version(self):
+        return Synchronization.objects.order_by('-time').values_list(
+            'id', flat=True).first()
+
+    def add(self, prefix_id, network, ixlan_id):
+        self.trees[network.version].insert(network, prefix_id,
+                                           (network, ixlan_id))
+        self.prefixes[prefix_id] = (network, ixlan_id)
+        self.ixlans[ixlan_id] += 1
+
+    def remove(self, prefix_id):
+        network, ixlan_id = self.prefixes.pop(prefix_id)
+        self.trees[network.version].remove(network, prefix_id)
+        self.ixlans[ixlan_id] -= 1
+        if not self.ixlans[ixlan_id]:
+            del self.ixlans[ixlan_id]
+
+    def refresh(self, force=False):
+        """
+        Brings the index up to date with the local database. Nothing is done
+        if it is already up to date with the last synchronization unless
+        force is set.
+        """
+        version = self.get_version()
+
+        with self.lock:
+            if self.loaded and not force and version == self.version:
+                return
+
+            current = {}
+            for prefix_id, prefix, ixlan_id in Prefix.objects.values_list(
+                    'id', 'prefix', 'ixlan_id'):
+                try:
+                    current[prefix_id] = (ipaddress.ip_network(prefix, strict=False),
+                                          ixlan_id)
+                except ValueError:
+                    self.logger.warning('ignoring invalid prefix %s', prefix)
+
+            # Remove what changed first in case a prefix moved to another ID
+            removed = [prefix_id for prefix_id, entry in self.prefixes.items()
+                       if current.get(prefix_id) != entry]
+            for prefix_id in removed:
+                self.remove(prefix_id)
+
+            added = 0
+            for prefix_id, (network, ixlan_id) in current.items():
+                if prefix_id not in self.prefixes:
+                    self.add(prefix_id, network, ixlan_id)
+                    added += 1
+
+            # One row per IX LAN, far fewer than the IX networks
+            self.ix_ids = dict(InternetExchangeLAN.objects.values_list(
+                'id', 'ix_id'))
+
+            self.loaded = True
+            self.version = version
+
+            self.logger.debug('prefix index refreshed: %s removed, %s added',
+                              len(removed), added)
+
+    def lookup(self, ip_address):
+        """
+        Returns a PrefixMatch for the longest prefix containing the given IP
+        address, None if there is none.
+        """
+        ip_address = ipaddress.ip_address(ip_address)
+        value = self.trees[ip_address.version].lookup(ip_address)
+
+        if value is None:
+            return None
+
+        network, ixlan_id = value
+        return PrefixMatch(network, ixlan_id, self.ix_ids.get(ixlan_id))
+
+    def has_ixlan(self, ixlan_id):
+        return ixlan_id in self.ixlans
+
+    def get_classifier(self, ixlan_id):
+        return IXLANClassifier(self, ixlan_id)
+
+
+prefix_index = PrefixIndex()
+
+
+def get_prefix_index():
+    """
+    Returns the prefix index of the process, up to date with the last
+    synchronization.
+    """
+    prefix_index.refresh()
+    return prefix_index
@@ -0,0 +1,15 @@
+from __future__ import unicode_literals
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .api import network_cache
+from .models import Network
+
+
+# No post_delete receiver, it would prevent Django from deleting networks in
+# bulk. Synchronizations and cache clears invalidate the cache themselves,
+# other deletions are noticed once entries expire.
+@receiver(post_save, sender=Network)
+def invalidate_network_lookups(sender, instance, **kwargs):
+    network_cache.invalidate()
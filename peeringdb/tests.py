@@ -1,13 +1,191 @@
 from __future__ import unicode_literals
 
-from django.test import TestCase
+import ipaddress
+import json
+import pickle
+import tempfile
+import threading
+import time
+
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.test import TestCase, override_settings
 from django.utils import timezone
+from django.utils.http import http_date
+
+from .api import (NAMESPACE_MODELS, NAMESPACES, JSONRecordStream, PeeringDB,
+                  PeeringDBError, get_session, make_object, network_cache)
+from .models import (Facility, InternetExchange, InternetExchangeLAN, Network,
+                     NetworkIXLAN, Organization, Prefix, Synchronization,
+                     SynchronizationCheckpoint)
+from .prefixes import PrefixIndex
+
+
+class JSONRecordStreamTestCase(TestCase):
+    def split(self, text, size):
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def test_records(self):
+        records = [
+            {'id': 1, 'name': 'Network, with "quotes" and {braces}'},
+            {'id': 23456, 'nested': {'list': [1, 2.5, None, True]}},
+        ]
+        text = json.dumps({'meta': {'count': 2}, 'data': records,
+                           'total': 123456})
+
+        # Chunks as small as one character must give the same result
+        for size in [1, 3, 7, len(text)]:
+            self.assertEqual(
+                list(JSONRecordStream(self.split(text, size))), records)
+
+    def test_empty(self):
+        self.assertEqual(list(JSONRecordStream([' { "data" : [ ] } '])), [])
+        self.assertEqual(list(JSONRecordStream(['{}'])), [])
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(JSONRecordStream(self.split('{"data": [{"id": 1}, {"id"', 4)))
+
+
+class ObjectTestCase(TestCase):
+    def test_attributes(self):
+        data = {'id': 1, 'asn': 64500, 'name': 'Network', 'website': ''}
+        network = make_object(NAMESPACES['network'], data)
+
+        # Known and unknown fields of the namespace are both reachable
+        self.assertEqual(network.asn, 64500)
+        self.assertEqual(network.website, '')
+        self.assertIsNone(getattr(network, 'irr_as_set', None))
+        with self.assertRaises(AttributeError):
+            network.info_type
+
+        # The record is wrapped, not copied
+        data['name'] = 'Renamed Network'
+        self.assertEqual(network.name, 'Renamed Network')
+
+    def test_pickle(self):
+        network = make_object(NAMESPACES['network'], {'id': 1, 'asn': 64500})
+        unpickled = pickle.loads(pickle.dumps(network))
+
+        self.assertIs(type(unpickled), type(network))
+        self.assertEqual(unpickled.asn, 64500)
+
+
+class PrefixIndexTestCase(TestCase):
+    def setUp(self):
+        InternetExchangeLAN.objects.create(id=1, ix_id=10)
+        Prefix.objects.create(id=1, protocol='IPv6', prefix='2001:db8::/32',
+                              ixlan_id=1)
+        Prefix.objects.create(id=2, protocol='IPv6', prefix='2001:db8:1::/48',
+                              ixlan_id=2)
+        Prefix.objects.create(id=3, protocol='IPv4', prefix='192.0.2.0/24',
+                              ixlan_id=1)
+
+    def test_lookup(self):
+        index = PrefixIndex()
+        index.refresh()
+
+        match = index.lookup('2001:db8::1')
+        self.assertEqual(match.prefix, ipaddress.ip_network('2001:db8::/32'))
+        self.assertEqual((match.ixlan_id, match.ix_id), (1, 10))
+
+        # Longest prefix wins
+        match = index.lookup(ipaddress.ip_address('2001:db8:1::1'))
+        self.assertEqual((match.ixlan_id, match.ix_id), (2, None))
+
+        self.assertEqual(index.lookup('192.0.2.255').ixlan_id, 1)
+        self.assertIsNone(index.lookup('192.0.3.1'))
+        self.assertIsNone(index.lookup('2001:db9::1'))
+
+        self.assertTrue(index.has_ixlan(2))
+        self.assertIn('2001:db8::2', index.get_classifier(1))
+        self.assertNotIn('2001:db8:1::2', index.get_classifier(1))
+
+    def test_refresh(self):
+        index = PrefixIndex()
+        index.refresh()
+
+        # Not reloaded until a new synchronization is recorded
+        Prefix.objects.filter(id=2).delete()
+        Prefix.objects.filter(id=3).update(prefix='198.51.100.0/24')
+        with self.assertNumQueries(1):
+            index.refresh()
+        self.assertEqual(index.lookup('2001:db8:1::1').ixlan_id, 2)
+
+        Synchronization.objects.create(time=timezone.now(), added=0,
+                                       updated=1, deleted=1)
+        index.refresh()
+        self.assertEqual(index.lookup('2001:db8:1::1').ixlan_id, 1)
+        self.assertFalse(index.has_ixlan(2))
+        self.assertIsNone(index.lookup('192.0.2.1'))
+        self.assertEqual(index.lookup('198.51.100.1').ixlan_id, 1)
+
+    def test_shared_prefix(self):
+        # The same prefix under another ID
+        Prefix.objects.create(id=4, protocol='IPv6', prefix='2001:db8::/32',
+                              ixlan_id=1)
+        index = PrefixIndex()
+        index.refresh()
+
+        Prefix.objects.filter(id=4).delete()
+        Synchronization.objects.create(time=timezone.now(), added=0,
+                                       updated=0, deleted=1)
+        index.refresh()
+        self.assertEqual(index.lookup('2001:db8::1').ixlan_id, 1)
+
+        Prefix.objects.filter(id=1).delete()
+        Synchronization.objects.create(time=timezone.now(), added=0,
+                                       updated=0, deleted=1)
+        index.refresh()
+        self.assertIsNone(index.lookup('2001:db8::1'))
+
+
+class IndexesTestCase(TestCase):
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            elif connection.vendor == 'postgresql':
+                # Tables are too small for indexes to be worth it otherwise
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+            else:
+                self.skipTest('No query plan for {}'.format(connection.vendor))
+
+            return ' '.join(str(column) for row in cursor.fetchall()
+                            for column in row)
 
-from .api import PeeringDB
-from .models import Network, NetworkIXLAN
+    def assertUsesIndex(self, queryset, index):
+        self.assertIn(index, self.get_plan(queryset))
+
+    def test_indexes(self):
+        self.assertUsesIndex(NetworkIXLAN.objects.filter(asn=64500),
+                             'peeringdb_netixlan_asn')
+        self.assertUsesIndex(NetworkIXLAN.objects.filter(ix_id=1),
+                             'peeringdb_netixlan_ix_asn')
+        self.assertUsesIndex(NetworkIXLAN.objects.filter(ix_id=1, asn=64500),
+                             'peeringdb_netixlan_ix_asn')
+        self.assertUsesIndex(NetworkIXLAN.objects.filter(ixlan_id=1),
+                             'peeringdb_netixlan_ixlan')
+        self.assertUsesIndex(Prefix.objects.filter(ixlan_id=1),
+                             'peeringdb_prefix_ixlan')
 
 
 class PeeringDBTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def mark_synchronized(self):
+        for namespace in NAMESPACE_MODELS:
+            SynchronizationCheckpoint.objects.create(
+                namespace=namespace, since=0, synchronized=timezone.now())
+
     def test_time_last_sync(self):
         api = PeeringDB()
 
@@ -27,6 +205,447 @@ class PeeringDBTestCase(TestCase):
         self.assertEqual(api.get_last_sync_time(),
                          int(time_of_sync.timestamp()))
 
+    def test_synchronize_objects(self):
+        api = PeeringDB()
+
+        Network.objects.create(id=1, asn=64501, name='Updated')
+        Network.objects.create(id=2, asn=64502, name='Deleted')
+        result = {'data': [
+            {'id': 1, 'asn': 64501, 'name': 'Updated Network', 'irr_as_set': None,
+             'info_prefixes6': 10, 'info_prefixes4': 20, 'status': 'ok'},
+            {'id': 2, 'asn': 64502, 'name': 'Deleted', 'irr_as_set': None,
+             'info_prefixes6': 0, 'info_prefixes4': 0, 'status': 'deleted'},
+            {'id': 3, 'asn': 64503, 'name': 'New Network', 'irr_as_set': None,
+             'info_prefixes6': 0, 'info_prefixes4': 0, 'status': 'ok'},
+            {'id': 4, 'asn': 64504, 'name': 'Never Seen', 'irr_as_set': None,
+             'info_prefixes6': 0, 'info_prefixes4': 0, 'status': 'deleted'},
+        ]}
+
+        with patch.object(PeeringDB, 'stream_lookup', return_value=iter(result['data'])):
+            changes = api.synchronize_objects(0, 'net', Network)
+
+        self.assertEqual(changes, (1, 1, 1))
+        self.assertEqual(sorted(Network.objects.values_list('id', flat=True)),
+                         [1, 3])
+        self.assertEqual(Network.objects.get(id=1).name, 'Updated Network')
+        self.assertEqual(Network.objects.get(id=1).info_prefixes4, 20)
+
+    def test_synchronize_objects_with_conflict(self):
+        api = PeeringDB()
+
+        Network.objects.create(id=1, asn=64501, name='Existing')
+        result = {'data': [
+            {'id': 2, 'asn': 64501, 'name': 'Conflicting ASN', 'irr_as_set': None,
+             'info_prefixes6': 0, 'info_prefixes4': 0, 'status': 'ok'},
+            {'id': 3, 'asn': 64503, 'name': 'New Network', 'irr_as_set': None,
+             'info_prefixes6': 0, 'info_prefixes4': 0, 'status': 'ok'},
+        ]}
+
+        with patch.object(PeeringDB, 'stream_lookup', return_value=iter(result['data'])):
+            changes = api.synchronize_objects(0, 'net', Network)
+
+        self.assertEqual(changes, (1, 0, 0))
+        self.assertEqual(sorted(Network.objects.values_list('id', flat=True)),
+                         [1, 3])
+
+    def test_update_local_database(self):
+        records = {
+            'net': [{'id': 1, 'asn': 64501, 'name': 'Network', 'irr_as_set': None,
+                     'info_prefixes6': 0, 'info_prefixes4': 0, 'status': 'ok'}],
+            'netixlan': [{'id': 1, 'asn': 64501, 'name': 'IX', 'ipaddr6': '2001:db8::1',
+                          'ipaddr4': None, 'is_rs_peer': False, 'ix_id': 1,
+                          'ixlan_id': 1, 'status': 'ok'}],
+            'ixpfx': [{'id': 1, 'protocol': 'IPv6', 'prefix': '2001:db8::/64',
+                       'ixlan_id': 1, 'status': 'ok'}],
+            'org': [{'id': 1, 'name': 'Organization', 'website': '', 'city': '',
+                     'country': 'FR', 'status': 'ok'}],
+            'fac': [{'id': 1, 'org_id': 1, 'name': 'Facility', 'website': '',
+                     'city': 'Paris', 'country': 'FR', 'status': 'ok'}],
+            'ix': [{'id': 1, 'org_id': 1, 'name': 'IX', 'name_long': 'Test IX',
+                    'website': '', 'city': 'Paris', 'country': 'FR', 'status': 'ok'}],
+            'ixlan': [{'id': 1, 'ix_id': 1, 'name': '', 'descr': '', 'mtu': 1500,
+                       'status': 'ok'}],
+        }
+        # Only passed if all namespaces are downloaded at the same time
+        barrier = threading.Barrier(len(records), timeout=5)
+
+        class Response(object):
+            status_code = 200
+
+            def __init__(self, namespace):
+                self.content = json.dumps({'data': records[namespace]}).encode('utf-8')
+
+            def iter_content(self, size):
+                barrier.wait()
+                return [self.content[i:i + size] for i in range(0, len(self.content), size)]
+
+            def close(self):
+                pass
+
+        with patch.object(PeeringDB, 'request', side_effect=lambda namespace, search, stream=False: Response(namespace)):
+            PeeringDB().update_local_database(0)
+
+        self.assertEqual(Network.objects.get(id=1).asn, 64501)
+        self.assertEqual(NetworkIXLAN.objects.get(id=1).ipaddr6, '2001:db8::1')
+        self.assertEqual(Prefix.objects.get(id=1).prefix, '2001:db8::/64')
+        self.assertEqual(Organization.objects.get(id=1).country, 'FR')
+        self.assertEqual(Facility.objects.get(id=1).city, 'Paris')
+        self.assertEqual(InternetExchange.objects.get(id=1).name_long, 'Test IX')
+        self.assertEqual(InternetExchangeLAN.objects.get(id=1).mtu, 1500)
+        self.assertEqual(Synchronization.objects.get().added, 7)
+
+    def test_update_local_database_by_page(self):
+        records = {
+            'net': [{'id': i, 'asn': 64500 + i, 'name': 'Network {}'.format(i),
+                     'irr_as_set': None, 'info_prefixes6': 0,
+                     'info_prefixes4': 0, 'status': 'ok'} for i in range(1, 6)],
+            'netixlan': [],
+            'ixpfx': [],
+        }
+        requests = []
+
+        def stream_lookup(namespace, search):
+            requests.append((namespace, search['skip']))
+            # Fail once while getting the third page of networks
+            if (namespace, search['skip']) == ('net', 4) and requests.count(('net', 4)) == 1:
+                return None
+            return iter(records.get(namespace, [])[search['skip']:search['skip'] + search['limit']])
+
+        api = PeeringDB()
+        with patch.object(PeeringDB, 'stream_lookup', side_effect=stream_lookup):
+            with self.assertRaises(PeeringDBError):
+                api.update_local_database(0, page_size=2)
+
+            self.assertEqual(Network.objects.count(), 4)
+            self.assertFalse(Synchronization.objects.exists())
+            checkpoint = SynchronizationCheckpoint.objects.get(namespace='net')
+            self.assertEqual((checkpoint.skip, checkpoint.complete), (4, False))
+            # Nothing is complete until the synchronization is done
+            self.assertFalse(api.is_synchronized(['org']))
+
+            api.update_local_database(0, page_size=2)
+
+        # The first two pages are not requested again
+        self.assertEqual(requests, [('org', 0), ('fac', 0), ('ix', 0),
+                                    ('ixlan', 0), ('net', 0), ('net', 2),
+                                    ('net', 4), ('net', 4), ('netixlan', 0),
+                                    ('ixpfx', 0)])
+        self.assertEqual(Network.objects.count(), 5)
+        self.assertEqual(Synchronization.objects.get().added, 5)
+        self.assertFalse(any(checkpoint.in_progress for checkpoint in
+                             SynchronizationCheckpoint.objects.all()))
+
+    def test_update_local_database_with_failed_download(self):
+        def download(namespace, search):
+            if namespace == 'netixlan':
+                return None
+            downloaded = tempfile.TemporaryFile()
+            downloaded.write(b'{"data": []}')
+            downloaded.seek(0)
+            return downloaded
+
+        with patch.object(PeeringDB, 'download', side_effect=download):
+            with self.assertRaises(PeeringDBError):
+                PeeringDB().update_local_database(0)
+
+        # Nothing is recorded, the next run starts from the same point
+        self.assertFalse(Synchronization.objects.exists())
+
+    def test_request_retries(self):
+        class Response(object):
+            def __init__(self, status_code, headers={}):
+                self.status_code = status_code
+                self.headers = headers
+
+            def close(self):
+                pass
+
+        responses = [Response(429, {'Retry-After': '5'}), Response(503),
+                     Response(200)]
+
+        with patch.object(get_session(), 'get', side_effect=responses) as get, \
+                patch('peeringdb.api.time.sleep') as sleep:
+            response = PeeringDB().request('net', {'asn': 64500})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get.call_count, 3)
+        # Retry-After is honoured, the backoff is used otherwise
+        self.assertEqual([call[0][0] for call in sleep.call_args_list],
+                         [5, 2])
+
+    @override_settings(PEERINGDB_MAX_RETRY_DELAY=10)
+    def test_retry_delay(self):
+        class Response(object):
+            def __init__(self, retry_after):
+                self.headers = {'Retry-After': retry_after}
+
+        api = PeeringDB()
+        in_5_seconds = http_date(time.time() + 5)
+
+        self.assertEqual(api.get_retry_delay(Response('5'), 0), 5)
+        self.assertAlmostEqual(api.get_retry_delay(Response(in_5_seconds), 0),
+                               5, delta=1)
+        # Long delays are capped
+        self.assertEqual(api.get_retry_delay(Response('3600'), 0), 10)
+        self.assertEqual(api.get_retry_delay(None, 5), 10)
+        # Invalid headers fall back to the backoff
+        for retry_after in ['soon', 'Mon, 99 Foo 2018 99:99:99 GMT']:
+            self.assertEqual(api.get_retry_delay(Response(retry_after), 1), 2)
+
+    @override_settings(PEERINGDB_RETRIES=1)
+    def test_request_gives_up(self):
+        class Response(object):
+            status_code = 502
+            headers = {}
+
+            def close(self):
+                pass
+
+        with patch.object(get_session(), 'get', return_value=Response()) as get, \
+                patch('peeringdb.api.time.sleep'):
+            response = PeeringDB().request('net', {'asn': 64500})
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(get.call_count, 2)
+
+    def test_watermarks(self):
+        records = {
+            'net': [{'id': 1, 'asn': 64501, 'name': 'Network', 'irr_as_set': None,
+                     'info_prefixes6': 0, 'info_prefixes4': 0, 'status': 'ok',
+                     'updated': '2018-02-01T00:00:00Z'},
+                    {'id': 2, 'asn': 64502, 'name': 'Network', 'irr_as_set': None,
+                     'info_prefixes6': 0, 'info_prefixes4': 0, 'status': 'ok',
+                     'updated': '2018-03-01T00:00:00Z'}],
+            'netixlan': [],
+            'ixpfx': [],
+        }
+        searches = []
+
+        def download(namespace, search):
+            searches.append((namespace, search['since']))
+            downloaded = tempfile.TemporaryFile()
+            downloaded.write(json.dumps({'data': records.get(namespace, [])}).encode('utf-8'))
+            downloaded.seek(0)
+            return downloaded
+
+        api = PeeringDB()
+        with patch.object(PeeringDB, 'download', side_effect=download):
+            api.update_local_database(100)
+            # Nothing new, no synchronization recorded
+            records['net'] = []
+            api.update_local_database(api.get_last_sync_time())
+
+        # Namespaces never synchronized start from the beginning, then
+        # networks start from the most recent update seen and other namespaces
+        # from the last synchronization
+        last_sync = api.get_last_sync_time()
+        first, second = searches[:len(searches) // 2], searches[len(searches) // 2:]
+        self.assertEqual(set(since for _, since in first), {0})
+        self.assertEqual(dict(second).pop('net'), 1519862400)
+        self.assertEqual(set(since for namespace, since in second
+                             if namespace != 'net'), {last_sync})
+
+    @override_settings(MY_ASN=64500)
+    def test_get_peers_for_ix(self):
+        api = PeeringDB()
+        self.mark_synchronized()
+        InternetExchange.objects.create(id=1, org_id=1, name='IX')
+
+        for i in range(10):
+            Network.objects.create(id=i + 1, asn=64500 + i,
+                                   name='Network {}'.format(i))
+            NetworkIXLAN.objects.create(id=i + 1, asn=64500 + i, name='IX',
+                                        ipaddr4='192.0.2.{}'.format(i + 1),
+                                        ix_id=1, ixlan_id=1)
+
+        # Two queries for the IX, one for its networks and three for all
+        # networks, no API call
+        with patch.object(PeeringDB, 'lookup') as lookup, self.assertNumQueries(6):
+            peers = api.get_peers_for_ix(1)
+        lookup.assert_not_called()
+
+        self.assertEqual(len(peers), 9)
+        for peer in peers:
+            self.assertEqual(peer['network'].asn, peer['network_ixlan'].asn)
+
+    def test_cached_objects_before_synchronization(self):
+        api = PeeringDB()
+        InternetExchange.objects.create(id=1, org_id=1, name='IX')
+        result = {'data': [{'id': 1, 'asn': 64501, 'name': 'IX',
+                            'ipaddr6': None, 'ipaddr4': '192.0.2.1',
+                            'is_rs_peer': False, 'ix_id': 1, 'ixlan_id': 1}]}
+
+        # Networks of the IX may not be synchronized yet, they are fetched
+        with patch.object(PeeringDB, 'lookup', return_value=result) as lookup, \
+                patch.object(PeeringDB, 'get_autonomous_systems', return_value={}):
+            peers = api.get_peers_for_ix(1)
+        lookup.assert_called_once_with(
+            NAMESPACES['network_internet_exchange_lan'], {'ix_id': 1, 'depth': 0})
+        self.assertEqual(len(peers), 1)
+
+    def test_cached_objects_without_children(self):
+        api = PeeringDB()
+        self.mark_synchronized()
+        InternetExchange.objects.create(id=1, org_id=1, name='IX')
+        InternetExchangeLAN.objects.create(id=1, ix_id=1)
+        NetworkIXLAN.objects.create(id=1, asn=64501, name='IX', ix_id=2,
+                                    ixlan_id=1)
+        Network.objects.create(id=1, asn=64502, name='Network')
+
+        # Known to have no peers, networks or prefixes, nothing to look for
+        with patch.object(PeeringDB, 'lookup') as lookup:
+            self.assertEqual(api.get_peers_for_ix(1), [])
+            self.assertEqual(list(api.get_ix_networks_for_asn(64502)), [])
+            self.assertEqual(api.get_prefixes_for_ix_network(1), [])
+        lookup.assert_not_called()
+
+    def test_get_autonomous_systems(self):
+        api = PeeringDB()
+        Network.objects.create(id=1, asn=64501, name='Cached')
+        results = {
+            'net': {'data': [{'id': 2, 'asn': 64502, 'name': 'Online',
+                              'irr_as_set': None, 'info_prefixes6': 0,
+                              'info_prefixes4': 0}]},
+            'netixlan': {'data': [{'id': 1, 'asn': 64502, 'name': 'IX',
+                                   'ipaddr6': None, 'ipaddr4': '192.0.2.1',
+                                   'is_rs_peer': False, 'ix_id': 1,
+                                   'ixlan_id': 1}]},
+        }
+
+        with patch.object(PeeringDB, 'lookup', side_effect=lambda namespace, search: results[namespace]) as lookup:
+            networks = api.get_autonomous_systems([64501, 64502, 64503])
+
+        # Only the missing ASes are looked up, with a single call for their
+        # details and one for their IX networks
+        self.assertEqual(lookup.call_count, 2)
+        lookup.assert_called_with(NAMESPACES['network'],
+                                  {'asn__in': '64502,64503', 'depth': 0})
+        self.assertEqual(networks[64501].name, 'Cached')
+        self.assertEqual(networks[64502].name, 'Online')
+        self.assertNotIn(64503, networks)
+
+        # Found ASes are cached with their IX networks
+        with patch.object(PeeringDB, 'lookup') as lookup:
+            self.assertEqual(api.get_autonomous_system(64502).name, 'Online')
+            self.assertEqual(
+                [network_ixlan.id for network_ixlan in api.get_ix_networks_for_asn(64502)], [1])
+        lookup.assert_not_called()
+
+    def test_network_lookups_cache(self):
+        api = PeeringDB()
+        self.mark_synchronized()
+        Network.objects.create(id=1, asn=64501, name='Network')
+        hits = network_cache.get_statistics()['hits']
+
+        with self.assertNumQueries(3):
+            for _ in range(3):
+                self.assertEqual(api.get_autonomous_system(64501).name, 'Network')
+
+        # Changing the network invalidates the cache
+        Network.objects.filter(asn=64501).update(name='Changed')
+        Network.objects.get(asn=64501).save()
+        self.assertEqual(api.get_autonomous_system(64501).name, 'Changed')
+
+        # And so does a synchronization
+        Network.objects.filter(asn=64501).update(name='Synchronized')
+
+        def download(namespace, search):
+            downloaded = tempfile.TemporaryFile()
+            downloaded.write(b'{"data": []}')
+            downloaded.seek(0)
+            return downloaded
+
+        with patch.object(PeeringDB, 'download', side_effect=download):
+            api.update_local_database(0)
+        self.assertEqual(api.get_autonomous_system(64501).name, 'Synchronized')
+
+        self.assertEqual(network_cache.get_statistics()['hits'] - hits, 2)
+
+    def test_cache_models_deleted_in_bulk(self):
+        collector = Collector(using='default')
+        for model in NAMESPACE_MODELS.values():
+            self.assertTrue(collector.can_fast_delete(model.objects.all()))
+
+    def test_missing_objects(self):
+        api = PeeringDB()
+
+        # Nothing found, the ASN is not looked up again for a while
+        with patch.object(PeeringDB, 'lookup', return_value={'data': []}) as lookup:
+            self.assertIsNone(api.get_autonomous_system(64501))
+            self.assertIsNone(api.get_autonomous_system(64501))
+        self.assertEqual(lookup.call_count, 2)
+
+        # A failed lookup tells nothing
+        with patch.object(PeeringDB, 'lookup', return_value=None) as lookup:
+            self.assertIsNone(api.get_autonomous_system(64502))
+            self.assertIsNone(api.get_autonomous_system(64502))
+        self.assertEqual(lookup.call_count, 4)
+
+    @override_settings(PEERINGDB_FETCHED_TIMEOUT=60)
+    def test_fetched_objects(self):
+        api = PeeringDB()
+        result = {'data': [{'id': 1, 'protocol': 'IPv6',
+                            'prefix': '2001:db8::/64', 'ixlan_id': 1}]}
+        NetworkIXLAN.objects.create(id=1, asn=64501, name='IX', ix_id=1,
+                                    ixlan_id=1)
+
+        with patch.object(PeeringDB, 'lookup', return_value=result) as lookup:
+            api.get_prefixes_for_ix_network(1)
+            # Written to the cache, no need to fetch it again
+            self.assertEqual(api.get_prefixes_for_ix_network(1),
+                             [{'protocol': 'IPv6', 'prefix': '2001:db8::/64'}])
+            self.assertEqual(lookup.call_count, 1)
+            self.assertIsNotNone(Prefix.objects.get(id=1).fetched)
+
+            # Fetched again once too old
+            Prefix.objects.update(
+                fetched=timezone.now() - timedelta(seconds=61))
+            api.get_prefixes_for_ix_network(1)
+            self.assertEqual(lookup.call_count, 2)
+
+        # Synchronized objects are not marked
+        records = [{'id': 1, 'protocol': 'IPv6', 'prefix': '2001:db8::/64',
+                    'ixlan_id': 1, 'status': 'ok'}]
+        api.synchronize_objects(0, NAMESPACES['internet_exchange_prefix'],
+                                Prefix, records=records)
+        self.assertIsNone(Prefix.objects.get(id=1).fetched)
+
+    @patch('peeringdb.api.LOOKUP_CHUNK_SIZE', 2)
+    def test_get_ix_networks(self):
+        api = PeeringDB()
+        searches = []
+
+        def lookup(namespace, search):
+            searches.append(search['id__in'])
+            return {'data': [{'id': int(i), 'asn': 64500, 'name': 'IX',
+                              'ipaddr6': None, 'ipaddr4': None,
+                              'is_rs_peer': False, 'ix_id': 1, 'ixlan_id': 1}
+                             for i in search['id__in'].split(',')]}
+
+        with patch.object(PeeringDB, 'lookup', side_effect=lookup):
+            network_ixlans = api.get_ix_networks([1, 2, 3])
+
+        # Chunked lookups, results are written to the cache
+        self.assertEqual(searches, ['1,2', '3'])
+        self.assertEqual(sorted(network_ixlans), [1, 2, 3])
+        self.assertEqual(NetworkIXLAN.objects.count(), 3)
+
+    def test_get_autonomous_systems_with_failed_lookup(self):
+        api = PeeringDB()
+        result = {'data': [{'id': 1, 'asn': 64501, 'name': 'Online',
+                            'irr_as_set': None, 'info_prefixes6': 0,
+                            'info_prefixes4': 0}]}
+
+        def lookup(namespace, search):
+            return result if namespace == NAMESPACES['network'] else None
+
+        with patch.object(PeeringDB, 'lookup', side_effect=lookup):
+            networks = api.get_autonomous_systems([64501])
+
+        # Not cached without its IX networks
+        self.assertEqual(networks[64501].name, 'Online')
+        self.assertFalse(Network.objects.exists())
+
     def test_get_autonomous_system(self):
         api = PeeringDB()
         asn = 15169
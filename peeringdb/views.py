@@ -5,16 +5,22 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect, reverse
 from django.views.generic import View
 
-from .api import PeeringDB
-from .models import Network, NetworkIXLAN, Synchronization
+from .api import PeeringDB, PeeringDBError, network_cache
+from .models import (Facility, InternetExchange, InternetExchangeLAN, Network,
+                     NetworkIXLAN, Organization, Prefix, Synchronization,
+                     SynchronizationCheckpoint)
+from .prefixes import prefix_index
 
 
 class BuildCacheView(LoginRequiredMixin, View):
     def get(self, request):
         if request.user.is_staff:
             api = PeeringDB()
-            api.update_local_database(api.get_last_sync_time())
-            messages.success(request, 'Successfully build the local cache.')
+            try:
+                api.update_local_database(api.get_last_sync_time())
+                messages.success(request, 'Successfully build the local cache.')
+            except PeeringDBError as e:
+                messages.error(request, str(e))
         else:
             messages.error(
                 request, 'You do not have the rights to build the local cache.')
@@ -25,9 +31,12 @@ class BuildCacheView(LoginRequiredMixin, View):
 class ClearCacheView(LoginRequiredMixin, View):
     def get(self, request):
         if request.user.is_staff:
-            Network.objects.all().delete()
-            NetworkIXLAN.objects.all().delete()
-            Synchronization.objects.all().delete()
+            for model in [Organization, Facility, InternetExchange,
+                          InternetExchangeLAN, Network, NetworkIXLAN, Prefix,
+                          Synchronization, SynchronizationCheckpoint]:
+                model.objects.all().delete()
+            prefix_index.clear()
+            network_cache.invalidate()
             messages.success(request, 'Successfully cleared the local cache.')
         else:
             messages.error(
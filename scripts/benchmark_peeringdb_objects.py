@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Microbenchmark comparing the cost of wrapping PeeringDB records with the
+historical Object implementation (JSON round trip into __dict__) and with the
+current one (slotted view over the record).
+
+Usage, from the root of the project:
+
+    python scripts/benchmark_peeringdb_objects.py [number_of_records]
+"""
+from __future__ import print_function, unicode_literals
+
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'peering_manager.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from peeringdb.api import NAMESPACES, make_object  # noqa: E402
+
+
+class LegacyObject(object):
+    def __init__(self, data):
+        self.__dict__ = json.loads(json.dumps(data))
+
+
+def build_payload(size):
+    return [{
+        'id': i,
+        'net_id': i,
+        'ix_id': i % 500,
+        'ixlan_id': i % 500,
+        'name': 'Internet Exchange {}'.format(i % 500),
+        'notes': '',
+        'speed': 10000,
+        'asn': 64512 + i,
+        'ipaddr4': '192.0.{}.{}'.format((i >> 8) % 256, i % 256),
+        'ipaddr6': '2001:db8::{:x}'.format(i),
+        'is_rs_peer': bool(i % 2),
+        'created': '2018-01-01T00:00:00Z',
+        'updated': '2018-01-01T00:00:00Z',
+        'status': 'ok',
+    } for i in range(size)]
+
+
+def measure(name, build, payload):
+    duration = min(timeit.repeat(lambda: build(payload), number=1, repeat=3))
+
+    tracemalloc.start()
+    objects = build(payload)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Accessing a field must work the same way for both implementations
+    assert objects[-1].asn == payload[-1]['asn']
+
+    print('{:<8} {:>10.3f} us/record {:>10.1f} bytes/record'.format(
+        name, duration * 1e6 / len(payload), float(memory) / len(payload)))
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payload = build_payload(size)
+    namespace = NAMESPACES['network_internet_exchange_lan']
+
+    print('{} records'.format(size))
+    measure('before', lambda p: [LegacyObject(d) for d in p], payload)
+    measure('after', lambda p: [make_object(namespace, d) for d in p], payload)
+
+
+if __name__ == '__main__':
+    main()
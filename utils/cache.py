@@ -0,0 +1,157 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+
+class LRUCache(object):
+    """
+    Thread-safe in-process cache keeping at most maxsize values, the least
+    recently used ones are dropped first. Values can also expire after a
+    given number of seconds.
+
+    It is meant to memoize lookups made over and over within a process, it
+    must be invalidated when the data it holds changes.
+    """
+
+    def __init__(self, maxsize=1000, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Values computed while the cache is invalidated must not be stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute, store=None):
+        """
+        Returns the value cached for the given key, or the result of the
+        given function which is then cached. If a store function is given,
+        the result is only cached when store(result) is true.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (self.timeout is None or
+                                      time.monotonic() - entry[1] < self.timeout):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self.generation
+
+        value = compute()
+
+        if store is None or store(value):
+            with self.lock:
+                if generation == self.generation:
+                    self.entries[key] = (value, time.monotonic())
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.maxsize:
+                        self.entries.popitem(last=False)
+
+        return value
+
+    def invalidate(self, keys):
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def get_statistics(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            }
+
+
+class SharedCache(object):
+    """
+    Namespace of the cache backend configured with the CACHE_BACKEND setting,
+    shared by all processes if the backend allows it.
+
+    Keys are prefixed with the namespace and its current version. Changing
+    the version invalidates all the keys of the namespace at once, the old
+    entries are left to expire. Values computed while the namespace is
+    invalidated are stored with the old version and never used.
+    """
+
+    def __init__(self, namespace, timeout=None):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.version_key = '{}.version'.format(namespace)
+        self.lock = threading.Lock()
+        # Lookups made by this process
+        self.hits = 0
+        self.misses = 0
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # Start from the current time so a version lost by the backend
+            # is never used again
+            cache.add(self.version_key, int(time.time() * 1000), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get_key(self, key):
+        return '{}.{}.{}'.format(self.namespace, self.get_version(), key)
+
+    def get_or_compute(self, key, compute, store=None, timeout=None):
+        """
+        Returns the value cached for the given key, or the result of the
+        given function which is then cached. If a store function is given,
+        the result is only cached when store(result) is true. If a timeout
+        function is given, the result expires after timeout(result) seconds
+        unless it returns None, the timeout of the namespace is used then.
+        """
+        key = self.get_key(key)
+
+        value = cache.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if value is None:
+            value = compute()
+            if store is None or store(value):
+                expiration = timeout(value) if timeout else None
+                if expiration is None:
+                    expiration = self.timeout
+                if expiration is None:
+                    cache.set(key, value)
+                else:
+                    cache.set(key, value, expiration)
+
+        return value
+
+    def invalidate(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # Not versioned yet, nothing to invalidate
+            pass
+
+    def get_statistics(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            }
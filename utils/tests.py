@@ -1,3 +1,145 @@
-from django.test import TestCase
+from __future__ import unicode_literals
 
-# Create your tests here.
+import shutil
+import tempfile
+import threading
+
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .cache import LRUCache, SharedCache
+
+
+class LRUCacheTestCase(TestCase):
+    def test_get_or_compute(self):
+        lru_cache = LRUCache(maxsize=2)
+        computed = []
+
+        def compute(key):
+            computed.append(key)
+            return key * 2
+
+        for key in [1, 2, 1, 3, 2, 1]:
+            self.assertEqual(lru_cache.get_or_compute(key, lambda: compute(key)),
+                             key * 2)
+
+        # 2 is dropped when 3 is added, then 1 when 2 comes back
+        self.assertEqual(computed, [1, 2, 3, 2, 1])
+        self.assertEqual(lru_cache.get_statistics(), {
+            'size': 2, 'hits': 1, 'misses': 5, 'hit_rate': 1 / 6})
+
+    def test_store(self):
+        lru_cache = LRUCache()
+
+        lru_cache.get_or_compute(1, lambda: None, store=lambda value: value is not None)
+        self.assertEqual(lru_cache.get_or_compute(1, lambda: 'value'), 'value')
+        self.assertEqual(lru_cache.get_or_compute(1, lambda: None), 'value')
+
+    def test_timeout(self):
+        lru_cache = LRUCache(timeout=10)
+
+        with patch('utils.cache.time.monotonic', return_value=100):
+            lru_cache.get_or_compute(1, lambda: 'old')
+        with patch('utils.cache.time.monotonic', return_value=105):
+            self.assertEqual(lru_cache.get_or_compute(1, lambda: 'new'), 'old')
+        with patch('utils.cache.time.monotonic', return_value=110):
+            self.assertEqual(lru_cache.get_or_compute(1, lambda: 'new'), 'new')
+
+    def test_invalidate(self):
+        lru_cache = LRUCache()
+        lru_cache.get_or_compute(1, lambda: 'old')
+        lru_cache.get_or_compute(2, lambda: 'old')
+
+        lru_cache.invalidate([1])
+        self.assertEqual(lru_cache.get_or_compute(1, lambda: 'new'), 'new')
+        self.assertEqual(lru_cache.get_or_compute(2, lambda: 'new'), 'old')
+
+        lru_cache.clear()
+        self.assertEqual(lru_cache.get_or_compute(2, lambda: 'new'), 'new')
+
+    def test_invalidate_while_computing(self):
+        lru_cache = LRUCache()
+        computing = threading.Event()
+        invalidated = threading.Event()
+
+        def compute():
+            computing.set()
+            invalidated.wait()
+            return 'old'
+
+        thread = threading.Thread(
+            target=lambda: lru_cache.get_or_compute(1, compute))
+        thread.start()
+        computing.wait()
+        lru_cache.invalidate([1])
+        invalidated.set()
+        thread.join()
+
+        # The value computed before the invalidation is not kept
+        self.assertEqual(lru_cache.get_or_compute(1, lambda: 'new'), 'new')
+
+
+class SharedCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def check_cache(self):
+        shared_cache = SharedCache('test')
+        other_cache = SharedCache('other')
+
+        self.assertEqual(shared_cache.get_or_compute('key', lambda: 'old'), 'old')
+        self.assertEqual(shared_cache.get_or_compute('key', lambda: 'new'), 'old')
+        self.assertEqual(other_cache.get_or_compute('key', lambda: 'other'), 'other')
+
+        # Only the keys of the namespace are invalidated
+        shared_cache.invalidate()
+        self.assertEqual(shared_cache.get_or_compute('key', lambda: 'new'), 'new')
+        self.assertEqual(other_cache.get_or_compute('key', lambda: 'new'), 'other')
+
+    def test_local_memory_backend(self):
+        self.check_cache()
+
+    def test_file_backend(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory}}):
+            self.check_cache()
+
+    def test_store(self):
+        shared_cache = SharedCache('test')
+
+        shared_cache.get_or_compute('key', lambda: [], store=bool)
+        self.assertEqual(shared_cache.get_or_compute('key', lambda: ['value']),
+                         ['value'])
+
+    def test_statistics(self):
+        shared_cache = SharedCache('test')
+
+        for _ in range(3):
+            shared_cache.get_or_compute('key', lambda: 'value')
+        self.assertEqual(shared_cache.get_statistics(), {
+            'hits': 2, 'misses': 1, 'hit_rate': 2 / 3})
+
+    def test_timeout(self):
+        shared_cache = SharedCache('test', timeout=60)
+
+        with patch.object(cache, 'set') as cache_set:
+            shared_cache.get_or_compute('empty', lambda: [],
+                                        timeout=lambda value: None if value else 5)
+            shared_cache.get_or_compute('full', lambda: ['value'],
+                                        timeout=lambda value: None if value else 5)
+        self.assertEqual([call[0][2] for call in cache_set.call_args_list], [5, 60])
+
+    def test_lost_version(self):
+        shared_cache = SharedCache('test')
+        shared_cache.get_or_compute('key', lambda: 'old')
+
+        # Keys of the previous version are not used again
+        cache.delete(shared_cache.version_key)
+        with patch('utils.cache.time.time', return_value=2000000000):
+            self.assertEqual(shared_cache.get_or_compute('key', lambda: 'new'), 'new')
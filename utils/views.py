@@ -302,7 +302,7 @@ class ModelListView(View):
 
     def get(self, request, *args, **kwargs):
         # If no query set has been provided for some reasons
-        if not self.queryset:
+        if self.queryset is None:
             self.queryset = self.build_queryset(request, kwargs)
 
         # If there is a filter, apply it